@@ -1,12 +1,38 @@
-import json
+import builtins
+import heapq
 import math
+import os
+import time
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict
+
+import numpy as np
+
+from readMap import BINARY_EXT, TILED_EXT, readBinaryMap, readCsvMap, readJsonMap, readTiledMap
+from routeCache import RouteCache
 
 def readMap(mapFilename):
-    with open(mapFilename + ".json") as f:
-        mapData = json.load(f)
-    with open(mapFilename + "_meta.json") as f:
-        meta = json.load(f)
-    return mapData, meta
+    """
+    Load a map. Uses the memory-mapped binary <map>.bmap or else the tiled
+    <map>.wtiles (see readMap.convertMap) when it is at least as new as the
+    source, otherwise parses <map>.json, or the _windDir.csv/_windSpeed.csv
+    pair when there is no JSON.
+    """
+    binary = mapFilename + BINARY_EXT
+    tiled = mapFilename + TILED_EXT
+    json_file = mapFilename + ".json"
+    source = json_file if os.path.exists(json_file) else mapFilename + "_windDir.csv"
+    def fresh(path):
+        return os.path.exists(path) and (not os.path.exists(source)
+                                         or os.path.getmtime(path) >= os.path.getmtime(source))
+    if fresh(binary):
+        return readBinaryMap(binary)
+    if fresh(tiled):
+        return readTiledMap(tiled)
+    if source == json_file:
+        return readJsonMap(mapFilename)
+    return readCsvMap(mapFilename)
 
 def relative_wind_angle(boat_dir, wind_dir):
     """Calculate relative angle between boat heading and wind-from direction"""
@@ -29,7 +55,174 @@ ALLOWED_MOVES = {
     300: ([-1, -1], "NW"),  # Northwest
 }
 
+# Bit i of a legal-move mask (and column i of the edge cost table) is HEADINGS[i]
+HEADINGS = sorted(ALLOWED_MOVES.keys())
+HEADING_INDEX = {heading: i for i, heading in enumerate(HEADINGS)}
+MASK_HEADINGS = [[h for i, h in enumerate(HEADINGS) if mask >> i & 1]
+                 for mask in range(1 << len(HEADINGS))]
+MASK_INDICES = [[HEADING_INDEX[h] for h in headings] for headings in MASK_HEADINGS]
+
+# Heading slot for a boat that has not moved yet, in searches whose states
+# carry the arriving heading index
+NO_HEADING = len(HEADINGS)
+
+# (row, col) step of each heading in array layout, where [0] is the top row
+HEADING_OFFSETS = [(-ALLOWED_MOVES[h][0][0], ALLOWED_MOVES[h][0][1]) for h in HEADINGS]
+
+# Move tables are built lazily in bands of this many rows, so a memory-mapped
+# map only reads the part of the grid the search reaches
+TABLE_BAND_ROWS = 64
+
+SEARCH_ENGINES = ("astar", "bidirectional", "anytime")
+# Engines Pathfinder accepts but the CLI and server do not offer: "jump"
+# only helps on exactly uniform wind and falls back to A* elsewhere
+SPECIAL_ENGINES = ("jump",)
+
+# Move tables are keyed by (frame index, interpolation step); a static map
+# only ever uses this one
+STATIC_TABLES = (0, 0)
+
+# Speed factor by angle between heading and wind-from direction, as
+# (minimum angle, factor) pairs. Below the first band the boat cannot sail.
+POLAR_BANDS = [
+    (30,  1.0),
+    (60,  0.95),
+    (90,  0.85),
+    (135, 0.70),
+]
+
+# Time penalty for changing heading between moves, keyed by heading change
+TURN_PENALTIES = {0: 0, 60: 4, 120: 4, 180: 4}
+
+class CostModel:
+    """
+    Cost of a single move.
+    mode="hops" charges 1 per move (the original behaviour).
+    mode="time" charges travel time: baseTime / (windSpeed * polar factor)
+    at the current cell, plus a turn penalty for changing heading.
+    """
+    def __init__(self, mode="hops", baseTime=10, noGoAngle=30,
+                 polarBands=POLAR_BANDS, turnPenalties=TURN_PENALTIES):
+        if mode not in ("hops", "time"):
+            raise ValueError(f"Unknown cost model mode: {mode}")
+        self.mode = mode
+        self.baseTime = baseTime
+        self.noGoAngle = noGoAngle
+        self.polarBands = sorted(polarBands)
+        self.turnPenalties = turnPenalties
+
+    @property
+    def usesHeading(self):
+        """Whether move cost depends on the previous heading"""
+        return self.mode == "time" and any(self.turnPenalties.values())
+
+    def key(self):
+        """Hashable description of every parameter that affects costs"""
+        return (self.mode, self.baseTime, self.noGoAngle, tuple(self.polarBands),
+                tuple(sorted(self.turnPenalties.items())))
+
+    def turnTable(self):
+        """
+        turnTable()[p][i] is the turn penalty from HEADINGS[p] to HEADINGS[i];
+        row p == len(HEADINGS) is for a boat with no heading yet.
+        """
+        return [[self.turnPenalty(prev, heading) for heading in HEADINGS]
+                for prev in HEADINGS + [None]]
+
+    def speedFactor(self, rel_angle):
+        """Fraction of wind speed reached at this angle to the wind-from direction"""
+        factor = 0
+        for min_angle, band_factor in self.polarBands:
+            if rel_angle >= min_angle:
+                factor = band_factor
+        return factor
+
+    def turnPenalty(self, prev_heading, heading):
+        if prev_heading is None or not self.usesHeading:
+            return 0
+        change = abs(heading - prev_heading) % 360
+        return self.turnPenalties[min(change, 360 - change)]
+
+    def moveCost(self, heading, prev_heading, wind_dir, wind_speed):
+        """Cost of moving with heading from a cell with the given wind"""
+        if self.mode == "hops":
+            return 1
+        factor = self.speedFactor(relative_wind_angle(heading, wind_dir))
+        boat_speed = wind_speed * factor
+        if boat_speed <= 0:
+            return math.inf
+        return self.baseTime / boat_speed + self.turnPenalty(prev_heading, heading)
+
+    def moveCostGrid(self, rel_angle, wind_speed):
+        """
+        Vectorised moveCost without the turn penalty, for arrays of relative
+        angles and wind speeds. Moves the boat cannot make cost inf.
+        """
+        rel_angle = np.asarray(rel_angle, dtype=np.float64)
+        if self.mode == "hops":
+            return np.ones(rel_angle.shape)
+        factor = np.zeros(rel_angle.shape)
+        for min_angle, band_factor in self.polarBands:
+            factor[rel_angle >= min_angle] = band_factor
+        boat_speed = wind_speed * factor
+        with np.errstate(divide="ignore"):
+            return np.where(boat_speed > 0, self.baseTime / boat_speed, np.inf)
+
+    def moveTables(self, rel_angle, in_bounds, wind_speed):
+        """
+        Legal-move masks (uint8, bit i for HEADINGS[i]) and float32 move
+        costs (inf where illegal) for windAngles grids and the wind speed of
+        the same cells
+        """
+        cost = self.moveCostGrid(rel_angle, wind_speed[..., None])
+        legal = in_bounds & (rel_angle >= self.noGoAngle) & np.isfinite(cost)
+        masks = (legal.astype(np.uint8) << np.arange(len(HEADINGS), dtype=np.uint8)).sum(axis=-1, dtype=np.uint8)
+        return masks, np.where(legal, cost, np.inf).astype(np.float32)
+
+    def minMoveCost(self, max_wind_speed):
+        """Lower bound on the cost of any single move on a map"""
+        if self.mode == "hops":
+            return 1
+        max_speed = max_wind_speed * max(f for _, f in self.polarBands)
+        return self.baseTime / max_speed
+
+def windAngles(wind_dir, r0, rows, cols, c0=0):
+    """
+    For the block of a rows x cols map from array row r0, col c0 with
+    wind_dir there: the angle between each heading and the wind-from
+    direction, and whether the move stays on the map, as (block rows, block
+    cols, len(HEADINGS)) grids. Neither depends on the cost model.
+    """
+    wind_from = (np.asarray(wind_dir, dtype=np.float64) + 180) % 360
+    y = rows - np.arange(r0, r0 + wind_from.shape[0])[:, None]
+    x = np.arange(c0 + 1, c0 + wind_from.shape[1] + 1)[None, :]
+    rel_angle = np.empty(wind_from.shape + (len(HEADINGS),))
+    in_bounds = np.empty(wind_from.shape + (len(HEADINGS),), dtype=bool)
+    for i, heading in enumerate(HEADINGS):
+        vector, _ = ALLOWED_MOVES[heading]
+        ny = y + vector[0]
+        nx = x + vector[1]
+        in_bounds[:, :, i] = (1 <= ny) & (ny <= rows) & (1 <= nx) & (nx <= cols)
+        diff = np.abs(heading - wind_from)
+        rel_angle[:, :, i] = np.minimum(diff, 360 - diff)
+    return rel_angle, in_bounds
+
+def min_moves(y, x, ty, tx):
+    """
+    Fewest moves between two cells. Every allowed move changes y by exactly
+    one and x by at most one, so it is max(|dy|, |dx|) rounded up to the
+    parity of dy.
+    """
+    dy = abs(ty - y)
+    n = max(dy, abs(tx - x))
+    if (n - dy) % 2:
+        n += 1
+    return n
+
 class Node:
+    """A search node; Pathfinder.searchAStar only builds these for observers"""
+    __slots__ = ("y", "x", "parent", "heading", "g_cost", "h_cost", "f_cost")
+
     def __init__(self, y, x, parent, heading, g_cost=0):
         self.y = y
         self.x = x
@@ -45,23 +238,297 @@ class Node:
     def __hash__(self):
         return hash((self.y, self.x))
 
+class SearchObserver:
+    """
+    Hooks called by Pathfinder.search. Every hook is a no-op here, so the
+    default search does no formatting or I/O; subclass and override what you
+    need. nodeExpanded is only called when expansionHooks is True, so leaving
+    it off keeps the hot loop free of per-node calls.
+    """
+    expansionHooks = False
+
+    def searchStarted(self, pathfinder):
+        pass
+
+    def nodeExpanded(self, node, valid_headings, iterations, frontier_size, explored_size):
+        pass
+
+    def routeImproved(self, path, cost, bound):
+        """
+        The anytime engine found a better route: its headings, cost, and
+        proven bound on cost / optimal cost
+        """
+        pass
+
+    def searchFinished(self, stats, path):
+        """stats is the dict also left in Pathfinder.stats; path the headings or None"""
+        pass
+
+class PrintObserver(SearchObserver):
+    """Console progress output, as the search used to print unconditionally"""
+    expansionHooks = True
+
+    def searchStarted(self, pathfinder):
+        self.pathfinder = pathfinder
+        start, end = pathfinder.startPos, pathfinder.endPos
+        print(f"Starting search from {start} to {end}")
+        start_wind = pathfinder.getDirSpeed(start[0], start[1])
+        end_wind = pathfinder.getDirSpeed(end[0], end[1])
+        print(f"Start wind: dir={start_wind[0]}°, speed={start_wind[1]:.2f}")
+        print(f"End wind: dir={end_wind[0]}°, speed={end_wind[1]:.2f}")
+
+    def nodeExpanded(self, node, valid_headings, iterations, frontier_size, explored_size):
+        # Debug: show when we have very few options
+        if len(valid_headings) <= 2 and node.y < 25:
+            wind_dir, _ = self.pathfinder.getDirSpeed(node.y, node.x, node.g_cost)
+            wind_from = (wind_dir + 180) % 360
+            rel_angles = []
+            for heading in ALLOWED_MOVES.keys():
+                rel = relative_wind_angle(heading, wind_dir)
+                status = "✓" if heading in valid_headings else "✗"
+                rel_angles.append(f"{ALLOWED_MOVES[heading][1]}:{rel:.0f}°{status}")
+            print(f"  Limited moves at ({node.y},{node.x}): wind={wind_dir}° from={wind_from}° -> {', '.join(rel_angles)}")
+        
+        if iterations % 5000 == 0:
+            print(f"Iteration {iterations}: pos=({node.y},{node.x}), "
+                  f"moves={len(valid_headings)}, frontier={frontier_size}, explored={explored_size}")
+
+    def routeImproved(self, path, cost, bound):
+        print(f"Route improved: {len(path)} moves, cost {cost:.2f}, within {bound:.3f}x of optimal")
+
+    def searchFinished(self, stats, path):
+        if path is None:
+            print(f"\n✗ No route found after {stats['nodesExpanded']} iterations!")
+            print(f"Final frontier size: {stats['frontierSize']}, explored: {stats['nodesExpanded']}")
+            return
+        
+        if stats["cacheHit"]:
+            print("\n✓ Found route in the route cache!")
+        else:
+            print(f"\n✓ Found route in {stats['nodesExpanded']} iterations!")
+        print(f"Route length: {len(path)} moves")
+        if self.pathfinder.costModel.mode == "time":
+            print(f"Route time: {stats['routeCost']:.2f}")
+        
+        # Show first few moves
+        print("\nFirst 10 moves:")
+        for i, heading in enumerate(path[:10]):
+            _, name = ALLOWED_MOVES[heading]
+            print(f"  {i+1}. {name} ({heading}°)")
+        if len(path) > 10:
+            print(f"  ... ({len(path) - 10} more moves)")
+
 class Pathfinder:
-    def __init__(self, mapData, meta):
+    def __init__(self, mapData, meta, costModel=None, observer=None,
+                 departTime=None, interpolateSteps=1, engine="astar", routeCache=None,
+                 weight=1.0, maxExpansions=100000, timeLimit=None, landmarks=None):
         self.mapData = mapData
+        self.meta = meta
         self.startPos = meta["startPos"]
         self.endPos = meta["finishPos"]
         self.rows = meta["rows"]
         self.cols = meta["cols"]
+        self.observer = observer or SearchObserver()
+        
+        # "astar" is the search below; the others live in engines.py
+        if engine not in SEARCH_ENGINES + SPECIAL_ENGINES:
+            raise ValueError(f"Unknown search engine: {engine}")
+        self.engine = engine
+        self.stats = {}  # filled in by search
+        
+        # Optional RouteCache consulted before searching; the part of the
+        # key that does not depend on the endpoints is hashed on first use
+        self.routeCache = routeCache
+        self.cacheMapKey = None
+        
+        # Search budget: stop after maxExpansions expansions or timeLimit
+        # seconds, whichever comes first (None for no limit). weight > 1
+        # inflates the heuristic: weighted A* in searchAStar, the first
+        # pass of the anytime engine.
+        self.weight = weight
+        self.maxExpansions = maxExpansions
+        self.timeLimit = timeLimit
+        
+        # Optional landmarks.LandmarkTables for this wind field and cost
+        # model (checked below); heuristic then uses their ALT bound, worked
+        # out as a flat grid per finish (landmarkBound, for landmarkFinish)
+        self.landmarks = landmarks
+        self.landmarkBound = None
+        self.landmarkFinish = None
+        
+        # searchAStar's state arrays, kept between searches (searchBuffers)
+        self.astarBuffers = None
+        
+        # Accept a CostModel or just its mode name ("hops" / "time")
+        if costModel is None or isinstance(costModel, str):
+            costModel = CostModel(costModel or "hops")
+        self.costModel = costModel
+        
+        # Works the same for nested lists (JSON) and np.memmap (binary maps).
+        # Tiled maps keep their TiledGrid views, which read tiles on demand.
+        self.tiles = mapData.get("tiles")
+        if self.tiles is None:
+            self.windDir = np.asarray(mapData["windDir"])
+            self.windSpeed = np.asarray(mapData["windSpeed"])
+        else:
+            self.windDir = mapData["windDir"]
+            self.windSpeed = mapData["windSpeed"]
+        
+        # Time-varying maps hold (T, rows, cols) stacks of wind frames and
+        # their timestamps. The wind for a move is the one in effect when the
+        # boat reaches the cell (departTime + elapsed route time), either the
+        # latest frame or, with interpolateSteps > 1, a blend of the two
+        # frames around it quantised to that many steps per frame interval.
+        self.times = mapData.get("times")
+        if self.times is not None and costModel.mode != "time":
+            raise ValueError("Time-varying wind needs the time cost model")
+        self.departTime = departTime if departTime is not None else (self.times or [0])[0]
+        self.interpolateSteps = interpolateSteps
+        
+        # Move tables per wind snapshot, in array layout ([0] is the top row):
+        #   legalMoves[r, c]    uint8 mask, bit i set if HEADINGS[i] is legal
+        #   edgeCosts[r, c, i]  float32 cost of HEADINGS[i] excluding turn penalty
+        # legalMoves/edgeCosts/bandBuilt are those of the first snapshot.
+        # Tiled maps have no whole-map tables; tileTables builds them per
+        # tile and keeps tileTableLimit tiles' worth, as many as the tile
+        # cache unless a search needs more (engines.searchTiled).
+        self.tables = {}
+        self.tileTableCache = OrderedDict()
+        self.tileTableLimit = None if self.tiles is None else self.tiles.maxTiles
+        if self.tiles is None:
+            self.legalMoves, self.edgeCosts, self.bandBuilt = self.getMoveTables(STATIC_TABLES)
+        else:
+            self.legalMoves = self.edgeCosts = self.bandBuilt = None
+        
+        # Cheapest possible move, used by the time heuristic
+        max_wind_speed = mapData.get("windSpeedMax")
+        if max_wind_speed is None:
+            max_wind_speed = float(self.windSpeed.max())
+        self.minMoveCost = costModel.minMoveCost(max_wind_speed)
+        
+        # Tables of another map or cost model would give a heuristic that
+        # overestimates, and wrong routes
+        if landmarks is not None:
+            landmarks.checkFor(self)
+    
+    def getMoveTables(self, key):
+        """(legalMoves, edgeCosts, bandBuilt) for a snapshot, allocated on first use"""
+        if key not in self.tables:
+            self.tables[key] = (
+                np.zeros((self.rows, self.cols), dtype=np.uint8),
+                np.empty((self.rows, self.cols, len(HEADINGS)), dtype=np.float32),
+                [False] * -(-self.rows // TABLE_BAND_ROWS),
+            )
+        return self.tables[key]
+    
+    def tableKey(self, elapsed):
+        """Move table key for the wind in effect after elapsed route time"""
+        if self.times is None:
+            return STATIC_TABLES
+        t = self.departTime + elapsed
+        i = min(max(bisect_right(self.times, t) - 1, 0), len(self.times) - 1)
+        if self.interpolateSteps <= 1 or i == len(self.times) - 1 or t <= self.times[i]:
+            return (i, 0)
+        frac = (t - self.times[i]) / (self.times[i + 1] - self.times[i])
+        return (i, int(frac * self.interpolateSteps))
+    
+    def windRows(self, key, r0, r1):
+        """Wind direction and speed for array rows r0:r1 of a snapshot"""
+        if self.times is None:
+            return (np.asarray(self.windDir[r0:r1], dtype=np.float64),
+                    np.asarray(self.windSpeed[r0:r1], dtype=np.float64))
+        i, step = key
+        wind_dir = np.asarray(self.windDir[i, r0:r1], dtype=np.float64)
+        wind_speed = np.asarray(self.windSpeed[i, r0:r1], dtype=np.float64)
+        if step == 0:
+            return wind_dir, wind_speed
+        frac = step / self.interpolateSteps
+        next_dir = np.asarray(self.windDir[i + 1, r0:r1], dtype=np.float64)
+        next_speed = np.asarray(self.windSpeed[i + 1, r0:r1], dtype=np.float64)
+        # Turn the short way round the compass
+        shift = (next_dir - wind_dir + 180) % 360 - 180
+        return (wind_dir + frac * shift) % 360, wind_speed + frac * (next_speed - wind_speed)
+    
+    def buildMoveTables(self, band=None, key=STATIC_TABLES):
+        """
+        Fill legalMoves and edgeCosts for one band of TABLE_BAND_ROWS rows
+        (or the whole map when band is None) of one wind snapshot. Legality is
+        the same rule as checkValidMove: in bounds and outside the no-go zone
+        around the wind-from direction at the current cell.
+        """
+        if self.tiles is not None:
+            raise ValueError("Tiled maps build their move tables per tile (see tileTables)")
+        legal_table, cost_table, band_built = self.getMoveTables(key)
+        if band is None:
+            r0, r1 = 0, self.rows
+        else:
+            r0 = band * TABLE_BAND_ROWS
+            r1 = min(r0 + TABLE_BAND_ROWS, self.rows)
+        wind_dir, wind_speed = self.windRows(key, r0, r1)
+        rel_angle, in_bounds = windAngles(wind_dir, r0, self.rows, self.cols)
+        legal_table[r0:r1], cost_table[r0:r1] = self.costModel.moveTables(rel_angle, in_bounds, wind_speed)
+        for b in range(r0 // TABLE_BAND_ROWS, -(-r1 // TABLE_BAND_ROWS)):
+            band_built[b] = True
+    
+    def tileTables(self, tr, tc, keep=()):
+        """
+        (legalMoves, edgeCosts) of tile (tr, tc) of a tiled map. Past
+        tileTableLimit the least recently used tables not in keep go first.
+        """
+        tables = self.tileTableCache.get((tr, tc))
+        if tables is not None:
+            self.tileTableCache.move_to_end((tr, tc))
+            return tables
+        size = self.tiles.tileSize
+        wind_dir = self.tiles.tile("windDir", tr, tc)
+        wind_speed = np.asarray(self.tiles.tile("windSpeed", tr, tc), dtype=np.float64)
+        rel_angle, in_bounds = windAngles(wind_dir, tr * size, self.rows, self.cols, tc * size)
+        tables = self.costModel.moveTables(rel_angle, in_bounds, wind_speed)
+        cache = self.tileTableCache
+        cache[(tr, tc)] = tables
+        if len(cache) > self.tileTableLimit:
+            spare = [tile for tile in cache if tile not in keep and tile != (tr, tc)]
+            for tile in spare[:len(cache) - self.tileTableLimit]:
+                del cache[tile]
+            while len(cache) > self.tileTableLimit:
+                cache.popitem(last=False)
+        return tables
+    
+    def setMoveTables(self, legalMoves, edgeCosts, key=STATIC_TABLES):
+        """Use move tables built elsewhere (for the whole map) for a snapshot"""
+        legal_table, cost_table, band_built = self.getMoveTables(key)
+        legal_table[...] = legalMoves
+        cost_table[...] = edgeCosts
+        band_built[:] = [True] * len(band_built)
+    
+    def tablesAt(self, node):
+        """(legalMoves, edgeCosts) in effect when the boat is at node"""
+        return self.tablesFor(node.y, node.g_cost)
+    
+    def tablesFor(self, y, elapsed):
+        """(legalMoves, edgeCosts) in effect at row y after elapsed route time"""
+        key = STATIC_TABLES if self.times is None else self.tableKey(elapsed)
+        legal_table, cost_table, band_built = self.tables.get(key) or self.getMoveTables(key)
+        band = (self.rows - y) // TABLE_BAND_ROWS
+        if not band_built[band]:
+            self.buildMoveTables(band, key)
+        return legal_table, cost_table
 
-    def getDirSpeed(self, y, x):
+    def getDirSpeed(self, y, x, elapsed=0):
         """
         Get wind direction and speed at logical position (y, x)
         y=1 is bottom row, y=30 is top row
         Array indexing: [0] is top row, [29] is bottom row
+        On time-varying maps, from the latest frame after elapsed route time.
         """
         array_row = self.rows - y
         array_col = x - 1
         
+        if self.times is not None:
+            frame, _ = self.tableKey(elapsed)
+            return (self.mapData["windDir"][frame][array_row][array_col],
+                    self.mapData["windSpeed"][frame][array_row][array_col])
+        
         windDir = self.mapData["windDir"][array_row][array_col]
         windSpeed = self.mapData["windSpeed"][array_row][array_col]
         return windDir, windSpeed
@@ -84,116 +551,268 @@ class Pathfinder:
         rel_angle = relative_wind_angle(heading, wind_dir)
         
         # Must be at least 30° away from wind-from direction (no-go zone)
-        return rel_angle >= 30
+        return rel_angle >= self.costModel.noGoAngle
 
     def getPossibleMoves(self, node):
-        """Get all valid headings from current node"""
-        valid_headings = []
-        
-        # Get wind at current position for debugging
-        wind_dir, wind_speed = self.getDirSpeed(node.y, node.x)
-        wind_from = (wind_dir + 180) % 360
+        """Get all valid headings from current node (a lookup in legalMoves)"""
+        legal_moves, _ = self.tablesAt(node)
+        return MASK_HEADINGS[legal_moves[self.rows - node.y, node.x - 1]]
+    
+    def heuristic(self, y, x):
+        """
+        With landmarks: the ALT bound, or the time-mode bound if larger.
+        Hop mode: Manhattan distance to goal.
+        Time mode: fewest moves to goal at the fastest boat speed on the map.
+        """
+        if self.landmarkBound is not None:
+            return float(self.landmarkBound[(self.rows - y) * self.cols + x - 1])
+        if self.costModel.mode == "time":
+            return min_moves(y, x, self.endPos[0], self.endPos[1]) * self.minMoveCost
+        return abs(self.endPos[0] - y) + abs(self.endPos[1] - x)
+    
+    def setLandmarkBound(self):
+        """Work out the landmark heuristic grid for the current finish"""
+        if self.landmarkFinish == list(self.endPos):
+            return
+        bound = self.landmarks.boundTo(self.endPos)
+        # Fewest moves is admissible too (unlike Manhattan distance), and
+        # tighter in places the landmarks do not cover well
+        y = self.rows - np.arange(self.rows)[:, None]
+        x = np.arange(1, self.cols + 1)[None, :]
+        dy = np.abs(self.endPos[0] - y)
+        moves = np.maximum(dy, np.abs(self.endPos[1] - x))
+        moves += (moves - dy) % 2
+        self.landmarkBound = np.maximum(bound, moves * self.minMoveCost).ravel()
+        self.landmarkFinish = list(self.endPos)
+    
+    def search(self, startPos=None, finishPos=None):
+        """
+        Plan from meta startPos to finishPos (or the given endpoints, which
+        then replace startPos/endPos) with the selected engine.
+        Returns the route in route.txt format, or None. Counters and phase
+        timings are left in self.stats and passed to the observer.
+        """
+        t0 = time.perf_counter()
+        if startPos is not None:
+            self.startPos = list(startPos)
+        if finishPos is not None:
+            self.endPos = list(finishPos)
+        if self.landmarks is not None:
+            self.setLandmarkBound()
+        self.observer.searchStarted(self)
         
-        for heading in ALLOWED_MOVES.keys():
-            if self.checkValidMove(node.y, node.x, heading):
-                valid_headings.append(heading)
+        if self.engine == "astar" and self.tiles is None:
+            engine = Pathfinder.searchAStar
+        else:
+            # engines.py builds on this module, so it is imported on first use.
+            # A* on a tiled map keeps its state in dicts, not whole-map arrays.
+            from engines import ENGINES, searchTiled
+            engine = searchTiled if self.engine == "astar" else ENGINES[self.engine]
         
-        # Debug: show when we have very few options
-        if len(valid_headings) <= 2 and node.y < 25:
-            rel_angles = []
-            for heading in ALLOWED_MOVES.keys():
-                rel = relative_wind_angle(heading, wind_dir)
-                status = "✓" if heading in valid_headings else "✗"
-                rel_angles.append(f"{ALLOWED_MOVES[heading][1]}:{rel:.0f}°{status}")
-            print(f"  Limited moves at ({node.y},{node.x}): wind={wind_dir}° from={wind_from}° -> {', '.join(rel_angles)}")
+        key = self.routeKey()
+        t1 = time.perf_counter()
+        entry = None if key is None else self.routeCache.get(key)
+        if entry is not None:
+            path, cost = entry["path"], entry["cost"]
+            # No search ran: keep the counter names, but none of the work
+            # the stored search did (0, False, empty)
+            counters = {name: type(value)() for name, value in entry["counters"].items()}
+        else:
+            path, cost, counters = engine(self)
+            # A search cut short by its budget says nothing about the route
+            if key is not None and not counters.get("outOfBudget"):
+                self.routeCache.put(key, path, cost, counters)
+        t2 = time.perf_counter()
+        route = None if path is None else headingsToRoute(path)
+        t3 = time.perf_counter()
         
-        return valid_headings
+        self.stats = {
+            "engine": self.engine,
+            "cacheHit": entry is not None,
+            "found": path is not None,
+            **counters,
+            "routeLength": None if path is None else len(path),
+            "routeCost": cost,
+            "time": {"setup": t1 - t0, "search": t2 - t1, "reconstruct": t3 - t2},
+        }
+        self.observer.searchFinished(self.stats, path)
+        return route
     
-    def heuristic(self, y, x):
-        """Manhattan distance to goal"""
-        return abs(self.endPos[0] - y) + abs(self.endPos[1] - x)
+    def routeKey(self):
+        """Route cache key for the current endpoints, or None without a cache"""
+        if self.routeCache is None:
+            return None
+        if self.cacheMapKey is None:
+            meta = {k: v for k, v in self.meta.items() if k not in ("startPos", "finishPos")}
+            self.cacheMapKey = self.routeCache.mapKey(
+                self.mapData, meta, self.costModel.key(), self.engine,
+                self.departTime, self.interpolateSteps, self.weight,
+                *(() if self.landmarks is None else (self.landmarks.key,)))
+        return self.routeCache.routeKey(self.cacheMapKey, self.startPos, self.endPos)
     
-    def search(self):
-        """A* pathfinding algorithm"""
-        frontier = []
-        explored = set()
+    def searchAStar(self):
+        """
+        A* pathfinding algorithm. Returns (headings, cost, counters), with
+        headings and cost None when no route is found.
+        """
+        observer = self.observer
+        on_expand = observer.nodeExpanded if observer.expansionHooks else None
+        rows, cols = self.rows, self.cols
+        goal_y, goal_x = self.endPos
+        slots = NO_HEADING + 1 if self.costModel.usesHeading else 1
+        turn = self.costModel.turnTable()
+        weight = self.weight
         
-        # Start node has no heading yet
-        start = Node(self.startPos[0], self.startPos[1], None, None, 0)
-        start.h_cost = self.heuristic(start.y, start.x)
-        start.f_cost = start.g_cost + start.h_cost
+        # Search state lives in flat arrays indexed by state id:
+        #   state id = cell id * slots + slot, cell id = array row * cols + array col
+        # where slot is the arriving heading index (NO_HEADING before the
+        # first move) when turns cost time, and always 0 otherwise.
+        # The arrays are allocated once per Pathfinder; each search only
+        # resets the states the previous one touched.
+        g_cost, parent, heading, closed, touched = self.searchBuffers(rows * cols * slots)
         
-        frontier.append(start)
+        # Binary heap of (f_cost, order, state id, g_cost). Decrease-key is
+        # lazy: a better path pushes a fresh entry and the stale one is
+        # skipped when popped.
+        frontier = []
+        order = 0
+        stale = 0
+        reopenings = 0
+        explored = 0
+        frontier_peak = 1
         
-        iterations = 0
-        max_iterations = 100000
+        # Start state has no heading yet
+        start_y, start_x = self.startPos
+        start = ((rows - start_y) * cols + start_x - 1) * slots + (NO_HEADING if slots > 1 else 0)
+        g_cost[start] = 0
+        touched.append(start)
+        heapq.heappush(frontier, (weight * self.heuristic(start_y, start_x), order, start, 0))
         
-        print(f"Starting search from {self.startPos} to {self.endPos}")
-        start_wind = self.getDirSpeed(self.startPos[0], self.startPos[1])
-        end_wind = self.getDirSpeed(self.endPos[0], self.endPos[1])
-        print(f"Start wind: dir={start_wind[0]}°, speed={start_wind[1]:.2f}")
-        print(f"End wind: dir={end_wind[0]}°, speed={end_wind[1]:.2f}")
+        iterations = 0
+        max_expansions = math.inf if self.maxExpansions is None else self.maxExpansions
+        deadline = None if self.timeLimit is None else time.perf_counter() + self.timeLimit
+        out_of_budget = False
+        goal = None
         
-        while len(frontier) > 0 and iterations < max_iterations:
+        while len(frontier) > 0:
+            if iterations >= max_expansions or (deadline is not None and time.perf_counter() > deadline):
+                out_of_budget = True
+                break
+            
+            # Get state with lowest f_cost
+            _, _, state, g = heapq.heappop(frontier)
+            if closed[state] or g > g_cost[state]:
+                stale += 1
+                continue  # stale heap entry
             iterations += 1
             
-            # Get node with lowest f_cost
-            frontier.sort(key=lambda n: n.f_cost)
-            current = frontier.pop(0)
+            cell, slot = divmod(state, slots)
+            r, c = divmod(cell, cols)
+            y, x = rows - r, c + 1
             
             # Check if we reached the goal
-            if current.y == self.endPos[0] and current.x == self.endPos[1]:
-                print(f"\n✓ Found route in {iterations} iterations!")
-                return self.reconstructPath(current)
+            if y == goal_y and x == goal_x:
+                goal = state
+                break
             
-            explored.add((current.y, current.x))
+            closed[state] = 1
+            explored += 1
             
-            # Get all valid headings from current position
-            valid_headings = self.getPossibleMoves(current)
+            # Valid moves and their costs from the move tables
+            legal_table, edge_table = self.tablesFor(y, g)
+            moves = MASK_INDICES[legal_table[r, c]]
+            edge_costs = edge_table[r, c].tolist()
+            turn_costs = turn[slot] if slots > 1 else turn[NO_HEADING]
             
-            if iterations % 5000 == 0:
-                print(f"Iteration {iterations}: pos=({current.y},{current.x}), "
-                      f"moves={len(valid_headings)}, frontier={len(frontier)}, explored={len(explored)}")
+            if on_expand is not None:
+                on_expand(self.nodeAt(state, g_cost, parent, heading, slots),
+                          [HEADINGS[i] for i in moves], iterations, len(frontier), explored)
             
-            for heading in valid_headings:
-                vector, _ = ALLOWED_MOVES[heading]
-                ny = current.y + vector[0]
-                nx = current.x + vector[1]
-                
-                if (ny, nx) in explored:
+            for i in moves:
+                dr, dc = HEADING_OFFSETS[i]
+                next_state = ((r + dr) * cols + c + dc) * slots + (i if slots > 1 else 0)
+                if closed[next_state]:
                     continue
                 
-                # Cost is 1 per move
-                new_g_cost = current.g_cost + 1
-                
-                # Check if node already in frontier
-                existing_idx = None
-                for i, node in enumerate(frontier):
-                    if node.y == ny and node.x == nx:
-                        existing_idx = i
-                        break
+                new_g_cost = g + edge_costs[i] + turn_costs[i]
                 
-                if existing_idx is None:
-                    # Add new node to frontier
-                    new_node = Node(ny, nx, current, heading, new_g_cost)
-                    new_node.h_cost = self.heuristic(ny, nx)
-                    new_node.f_cost = new_node.g_cost + new_node.h_cost
-                    frontier.append(new_node)
-                else:
-                    # Update existing node if we found a better path
-                    node = frontier[existing_idx]
-                    if new_g_cost < node.g_cost:
-                        node.g_cost = new_g_cost
-                        node.f_cost = node.g_cost + node.h_cost
-                        node.parent = current
-                        node.heading = heading
-        
-        print(f"\n✗ No route found after {iterations} iterations!")
-        print(f"Final frontier size: {len(frontier)}, explored: {len(explored)}")
-        return None
+                # Only queue the neighbour if this is the best path to it so far
+                old_g_cost = g_cost[next_state]
+                if new_g_cost < old_g_cost:
+                    if old_g_cost != math.inf:
+                        reopenings += 1
+                    else:
+                        touched.append(next_state)
+                    g_cost[next_state] = new_g_cost
+                    parent[next_state] = state
+                    heading[next_state] = i
+                    order += 1
+                    f_cost = new_g_cost + weight * self.heuristic(y - dr, x + dc)
+                    heapq.heappush(frontier, (f_cost, order, next_state, new_g_cost))
+            
+            if len(frontier) > frontier_peak:
+                frontier_peak = len(frontier)
+        
+        counters = {
+            "nodesExpanded": iterations,
+            "nodesGenerated": order,
+            "staleEntries": stale,
+            "reopenings": reopenings,
+            "frontierPeak": frontier_peak,
+            "frontierSize": len(frontier),
+            "outOfBudget": out_of_budget,
+        }
+        if goal is None:
+            return None, None, counters
+        
+        path = []
+        state = goal
+        while parent[state] >= 0:
+            path.append(HEADINGS[heading[state]])
+            state = parent[state]
+        path.reverse()
+        return path, g_cost[goal], counters
     
-    def reconstructPath(self, goal_node):
-        """Reconstruct path from goal to start"""
+    def searchBuffers(self, size):
+        """
+        (g_cost, parent, heading, closed, touched) state arrays for
+        searchAStar, reset to unset for the states listed in touched by the
+        last search (or allocated, the first time)
+        """
+        buffers = self.astarBuffers
+        if buffers is None or len(buffers[0]) != size:
+            buffers = (
+                array("d", [math.inf]) * size,   # lowest g queued so far
+                array("i", [-1]) * size,         # state id the best path came from
+                array("b", [-1]) * size,         # heading index of the move into the state
+                bytearray(size),                 # expanded
+                [],                              # states set since the last reset
+            )
+            self.astarBuffers = buffers
+            return buffers
+        g_cost, parent, heading, closed, touched = buffers
+        inf = math.inf
+        for state in touched:
+            g_cost[state] = inf
+            parent[state] = -1
+            heading[state] = -1
+            closed[state] = 0
+        touched.clear()
+        return buffers
+    
+    def nodeAt(self, state, g_cost, parent, heading, slots):
+        """A Node view of a search state, with its parent chain, for observers"""
+        cell = state // slots
+        r, c = divmod(cell, self.cols)
+        up = None if parent[state] < 0 else self.nodeAt(parent[state], g_cost, parent, heading, slots)
+        node = Node(self.rows - r, c + 1, up,
+                    None if heading[state] < 0 else HEADINGS[heading[state]], g_cost[state])
+        node.h_cost = self.heuristic(node.y, node.x)
+        node.f_cost = node.g_cost + node.h_cost
+        return node
+    
+    def pathHeadings(self, goal_node):
+        """Headings from start to goal_node, following parent links"""
         path = []
         current = goal_node
         
@@ -202,39 +821,40 @@ class Pathfinder:
             current = current.parent
         
         path.reverse()
-        
-        # Convert to compass directions and write to file
-        route_lines = []
-        for heading in path:
-            _, compass_name = ALLOWED_MOVES[heading]
-            route_lines.append(compass_name)
-        
-        route = "\n".join(route_lines)
-        
-        with open("route.txt", "w") as f:
-            f.write(route)
-        
-        print(f"Route length: {len(path)} moves")
-        print(f"Route saved to route.txt")
-        
-        # Show first few moves
-        print("\nFirst 10 moves:")
-        for i, heading in enumerate(path[:10]):
-            _, name = ALLOWED_MOVES[heading]
-            print(f"  {i+1}. {name} ({heading}°)")
-        if len(path) > 10:
-            print(f"  ... ({len(path) - 10} more moves)")
-        
-        return route
+        return path
+    
+    def reconstructPath(self, goal_node):
+        """Reconstruct path from goal to start, in route.txt format"""
+        return headingsToRoute(self.pathHeadings(goal_node))
+
+def headingsToRoute(path):
+    """Headings to the route.txt format: one compass name per line"""
+    return "\n".join(ALLOWED_MOVES[heading][1] for heading in path)
+
+def writeRoute(route, route_file="route.txt"):
+    with open(route_file, "w") as f:
+        f.write(route)
 
-def validate_route(mapData, meta, route_file="route.txt"):
-    """Validate a route by simulating the exact game logic"""
+def _quiet(*args, **kwargs):
+    pass
+
+def validate_route(mapData, meta, route_file="route.txt", route=None, verbose=True):
+    """
+    Validate a route by simulating the exact game logic. The route is read
+    from route_file unless given directly (route.txt text or a list of
+    compass names); verbose=False skips the move-by-move report.
+    """
+    print = builtins.print if verbose else _quiet
     print("\n" + "="*60)
     print("VALIDATING ROUTE MOVE-BY-MOVE")
     print("="*60)
     
-    with open(route_file, 'r') as f:
-        moves = [line.strip() for line in f if line.strip()]
+    if route is None:
+        with open(route_file, 'r') as f:
+            route = f.read()
+    if isinstance(route, str):
+        route = route.splitlines()
+    moves = [line.strip() for line in route if line.strip()]
     
     # Reverse lookup: compass name to heading
     name_to_heading = {}
@@ -320,9 +940,113 @@ def validate_route(mapData, meta, route_file="route.txt"):
         print(f"   Distance to goal: {abs(meta['finishPos'][0] - y) + abs(meta['finishPos'][1] - x)} cells")
         return False
 
+# Route array codes besides the HEADINGS indices
+ROUTE_END = -1       # padding after a route's last move
+ROUTE_INVALID = -2   # a move name validate_route would reject
+
+def routesToArray(routes):
+    """
+    Pack routes (route.txt text or lists of compass names) into the int8
+    (N, L) array of HEADINGS indices used by validate_routes.
+    """
+    name_to_index = {name: HEADING_INDEX[heading] for heading, (_, name) in ALLOWED_MOVES.items()}
+    moves = []
+    for route in routes:
+        if isinstance(route, str):
+            route = route.splitlines()
+        moves.append([name_to_index.get(m.strip(), ROUTE_INVALID) for m in route if m.strip()])
+    arr = np.full((len(moves), max((len(m) for m in moves), default=0)), ROUTE_END, dtype=np.int8)
+    for i, m in enumerate(moves):
+        arr[i, :len(m)] = m
+    return arr
+
+def validate_routes(mapData, meta, routes, costModel=None):
+    """
+    Validate N routes at once with the same rules as validate_route,
+    simulating them in lockstep over the wind grid. routes is an int8 (N, L)
+    array of HEADINGS indices padded with ROUTE_END (see routesToArray).
+    
+    Returns (valid, fail_step, total_time) arrays of length N:
+      valid       route ends on the finish (as in validate_route, a route
+                  stops at its first bad move and is judged where it stopped)
+      fail_step   index of the first bad move, or -1
+      total_time  cost of the moves made under costModel (default: hops)
+    """
+    if costModel is None or isinstance(costModel, str):
+        costModel = CostModel(costModel or "hops")
+    routes = np.asarray(routes, dtype=np.int8)
+    n, length = routes.shape
+    rows, cols = meta["rows"], meta["cols"]
+    wind_dir = np.asarray(mapData["windDir"], dtype=np.float64)
+    wind_speed = np.asarray(mapData["windSpeed"], dtype=np.float64)
+    
+    headings = np.array(HEADINGS, dtype=np.float64)
+    vectors = np.array([ALLOWED_MOVES[h][0] for h in HEADINGS])
+    # Last row is for the first move, which has no previous heading
+    turn = np.array(costModel.turnTable(), dtype=np.float64)
+    
+    y = np.full(n, meta["startPos"][0])
+    x = np.full(n, meta["startPos"][1])
+    prev = np.full(n, len(HEADINGS))
+    moving = np.ones(n, dtype=bool)
+    fail_step = np.full(n, -1)
+    total_time = np.zeros(n)
+    
+    for step in range(length):
+        h = routes[:, step].astype(np.intp)
+        moving &= h != ROUTE_END
+        if not moving.any():
+            break
+        
+        bad = moving & ((h < 0) | (h >= len(HEADINGS)))
+        h = np.where(bad | ~moving, 0, h)
+        
+        # Wind at the CURRENT cell, as in validate_route
+        here_dir = wind_dir[rows - y, x - 1]
+        here_speed = wind_speed[rows - y, x - 1]
+        wind_from = (here_dir + 180) % 360
+        diff = np.abs(headings[h] - wind_from)
+        rel_angle = np.minimum(diff, 360 - diff)
+        
+        ny = y + vectors[h, 0]
+        nx = x + vectors[h, 1]
+        in_bounds = (1 <= ny) & (ny <= rows) & (1 <= nx) & (nx <= cols)
+        bad |= moving & (~in_bounds | (rel_angle < costModel.noGoAngle))
+        
+        fail_step[bad] = step
+        moving &= ~bad
+        cost = costModel.moveCostGrid(rel_angle, here_speed) + turn[prev, h]
+        total_time[moving] += cost[moving]
+        y = np.where(moving, ny, y)
+        x = np.where(moving, nx, x)
+        prev = np.where(moving, h, prev)
+    
+    valid = (y == meta["finishPos"][0]) & (x == meta["finishPos"][1])
+    return valid, fail_step, total_time
+
 def main(): 
-    mapData, meta = readMap("map_2_Main")
-    pathfinder = Pathfinder(mapData, meta)
+    import argparse
+    parser = argparse.ArgumentParser(description="Plan a route on a map")
+    parser.add_argument("maps", nargs="*", default=["map_2_Main"], help="map name (default: map_2_Main); several with --profile")
+    parser.add_argument("--profile", action="store_true",
+                        help="profile the solve of every map instead (see profiling.py)")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[],
+                        help="with --profile, also synthetic grids of these sizes")
+    parser.add_argument("--cost", choices=["hops", "time"], default="hops", help="cost model")
+    parser.add_argument("--engine", choices=SEARCH_ENGINES, default="astar", help="search engine")
+    parser.add_argument("--cache", default=None, help="route cache directory (default: no cache)")
+    args = parser.parse_args()
+    if len(args.maps) > 1 and not args.profile:
+        parser.error("a normal run solves one map (and writes route.txt); pass several with --profile")
+    
+    if args.profile:
+        from profiling import cases, profileMaps
+        profileMaps(cases(args.maps, args.sizes), args.cost, args.engine)
+        return
+    
+    mapData, meta = readMap(args.maps[0])
+    pathfinder = Pathfinder(mapData, meta, args.cost, observer=PrintObserver(),
+                            engine=args.engine, routeCache=RouteCache(args.cache) if args.cache else None)
     result = pathfinder.search()
     
     if result is None:
@@ -332,6 +1056,9 @@ def main():
         print("  - The no-go zone (30° from wind-from) blocks all paths")
         print("  - There's still a bug in the coordinate system")
     else:
+        writeRoute(result)
+        print("Route saved to route.txt")
+        
         # Validate the generated route
         validate_route(mapData, meta)
 
@@ -0,0 +1,129 @@
+"""
+Plan many start/finish pairs on one map in parallel.
+
+The wind grids are loaded once in the parent and placed in shared memory;
+each worker process attaches to them and keeps one Pathfinder, so only the
+(start, finish) pairs and the resulting routes cross process boundaries.
+
+    python batch.py map_2_Main pairs.json --cost time --workers 16
+"""
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from ai import Pathfinder, readMap
+from readMap import readTiledMap
+
+WIND_KEYS = ("windDir", "windSpeed")
+# Per-process parts of a map that shareWind/attachWind hand over instead
+# of pickling: the grids, and the open TileStore behind a tiled map
+LOCAL_KEYS = WIND_KEYS + ("tiles",)
+
+# Per-process state set up by initWorker
+_worker = {}
+
+def shareWind(mapData):
+    """
+    Copy the wind grids into shared memory blocks. Returns the blocks (the
+    caller must close and unlink them) and a picklable description of them.
+    A tiled map is not copied: each worker reopens its .wtiles file, since
+    an open file (and its offset) cannot be shared between processes.
+    """
+    store = mapData.get("tiles")
+    if store is not None:
+        return [], {"tiles": (store.path, store.maxTiles)}
+    blocks, specs = [], {}
+    for key in WIND_KEYS:
+        arr = np.asarray(mapData[key])
+        shm = shared_memory.SharedMemory(create=True, size=max(arr.nbytes, 1))
+        np.ndarray(arr.shape, dtype=arr.dtype, buffer=shm.buf)[...] = arr
+        blocks.append(shm)
+        specs[key] = (shm.name, arr.shape, arr.dtype.str)
+    return blocks, specs
+
+def attachWind(specs):
+    """Map shared wind blocks back into arrays (read-only views)"""
+    if "tiles" in specs:
+        mapData, _ = readTiledMap(*specs["tiles"])
+        return mapData, []
+    mapData, blocks = {}, []
+    for key, (name, shape, dtype) in specs.items():
+        shm = shared_memory.SharedMemory(name=name)
+        arr = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        arr.flags.writeable = False
+        mapData[key] = arr
+        blocks.append(shm)
+    return mapData, blocks
+
+def mapExtras(mapData):
+    """Everything in mapData besides the grids (frame times, max speed), which is small"""
+    return {key: value for key, value in mapData.items() if key not in LOCAL_KEYS}
+
+def initWorker(specs, extras, meta, costModel):
+    mapData, blocks = attachWind(specs)
+    mapData.update(extras)
+    _worker["blocks"] = blocks
+    _worker["pathfinder"] = Pathfinder(mapData, meta, costModel)
+
+def solvePair(pair):
+    start, finish = pair
+    return _worker["pathfinder"].search(start, finish)
+
+def solveBatch(mapFilename, pairs, costModel="hops", workers=None):
+    """
+    Plan a route for every (start, finish) pair on one map. Returns the
+    routes (compass strings as from Pathfinder.search, or None when no
+    route exists) in the same order as pairs.
+    """
+    pairs = [(list(start), list(finish)) for start, finish in pairs]
+    mapData, meta = readMap(mapFilename)
+    workers = workers or os.cpu_count()
+    # Small batches are cheapest to hand out in a few big chunks
+    chunksize = max(1, len(pairs) // (workers * 4))
+
+    extras = mapExtras(mapData)
+
+    blocks, specs = shareWind(mapData)
+    try:
+        with ProcessPoolExecutor(workers, initializer=initWorker,
+                                 initargs=(specs, extras, meta, costModel)) as pool:
+            return list(pool.map(solvePair, pairs, chunksize=chunksize))
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan many start/finish pairs on one map")
+    parser.add_argument("map", help="map name, e.g. map_2_Main")
+    parser.add_argument("pairs", help='JSON file of [[startY, startX], [finishY, finishX]] pairs, or "-" for stdin')
+    parser.add_argument("--cost", choices=["hops", "time"], default="hops", help="cost model")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--out", default="-", help='output JSON file (default "-" for stdout)')
+    args = parser.parse_args()
+
+    if args.pairs == "-":
+        pairs = json.load(sys.stdin)
+    else:
+        with open(args.pairs) as f:
+            pairs = json.load(f)
+
+    routes = solveBatch(args.map, pairs, args.cost, args.workers)
+    results = [{"start": start, "finish": finish,
+                "route": None if route is None else route.split()}
+               for (start, finish), route in zip(pairs, routes)]
+
+    if args.out == "-":
+        json.dump(results, sys.stdout, indent=1)
+        print()
+    else:
+        with open(args.out, "w") as f:
+            json.dump(results, f, indent=1)
+
+if __name__ == "__main__":
+    main()
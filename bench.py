@@ -0,0 +1,168 @@
+"""
+Benchmark Pathfinder on the shipped maps and on synthetic wind grids.
+
+Each case runs search + validate_route and records wall time, nodes
+expanded, peak traced memory and route cost. The JSON report can be saved
+as a baseline and later runs compared against it:
+
+    python bench.py --save-baseline bench_baseline.json
+    python bench.py --baseline bench_baseline.json
+"""
+import argparse
+import json
+import platform
+import time
+import tracemalloc
+
+import numpy as np
+
+from ai import Pathfinder, readMap, validate_route
+
+SHIPPED_MAPS = ["map_1_Training", "map_2_Main", "map_3_Tiebreaker"]
+SYNTHETIC_SIZES = [100, 500, 2000]
+
+# A case is a regression when it is this much slower than the baseline
+TIME_TOLERANCE = 0.25
+
+def makeSyntheticMap(rows, cols, seed=0):
+    """
+    Wind grid in the style of the shipped maps: the direction rotates
+    smoothly across the map (in whole 5° steps) and the speed varies gently
+    around 4-5. Start is the bottom-left corner, finish on the top row.
+    """
+    rng = np.random.default_rng(seed)
+    v = np.linspace(0, 1, rows)[:, None]
+    u = np.linspace(0, 1, cols)[None, :]
+
+    # A few random low-frequency waves keep it smooth at any size
+    wobble = sum(rng.uniform(-1, 1) * np.sin(2 * np.pi * (k * u + rng.uniform(0, 1)))
+                 * np.cos(2 * np.pi * (k * v + rng.uniform(0, 1))) for k in (1, 2, 3))
+    base = rng.uniform(160, 200)
+    wind_dir = base + 45 * u + 30 * v + 10 * wobble
+    wind_dir = (np.round(wind_dir / 5) * 5) % 360
+    wind_speed = 4.5 + 0.8 * np.sin(2 * np.pi * (u + v)) + 0.3 * wobble
+
+    name = f"synthetic_{rows}x{cols}"
+    meta = {
+        "name": name,
+        "startPos": [rows, 1],
+        "finishPos": [1, max(1, cols * 2 // 3)],
+        "rows": rows,
+        "cols": cols,
+        "angles_are_degrees": True,
+        "windDir_is_TO_direction": True,
+        "headings_allowed_deg": [0, 60, 120, 180, 240, 300],
+    }
+    mapData = {"name": name, "windDir": wind_dir, "windSpeed": wind_speed}
+    return mapData, meta
+
+def solve(mapData, meta, costModel):
+    # No expansion cap: a benchmark of a search giving up measures nothing
+    pathfinder = Pathfinder(mapData, meta, costModel, maxExpansions=None)
+    route = pathfinder.search()
+    valid = route is not None and validate_route(mapData, meta, route=route, verbose=False)
+    return pathfinder.stats, valid
+
+def runCase(mapData, meta, costModel, memory=True):
+    t0 = time.perf_counter()
+    stats, valid = solve(mapData, meta, costModel)
+    wall = time.perf_counter() - t0
+
+    result = {
+        "wallTime": wall,
+        "searchTime": stats["time"]["search"],
+        "nodesExpanded": stats["nodesExpanded"],
+        "frontierPeak": stats["frontierPeak"],
+        "found": stats["found"],
+        "outOfBudget": stats.get("outOfBudget", False),
+        "valid": valid,
+        "routeLength": stats["routeLength"],
+        "routeCost": stats["routeCost"],
+    }
+    # tracemalloc slows the interpreter down, so memory is a separate run
+    if memory:
+        tracemalloc.start()
+        solve(mapData, meta, costModel)
+        result["peakMemory"] = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    return result
+
+def cases(sizes):
+    for name in SHIPPED_MAPS:
+        yield name, lambda name=name: readMap(name)
+    for size in sizes:
+        yield f"synthetic_{size}", lambda size=size: makeSyntheticMap(size, size)
+
+def runBenchmarks(sizes=SYNTHETIC_SIZES, costModels=("hops", "time"), memory=True, log=print):
+    report = {
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "results": {},
+    }
+    for name, load in cases(sizes):
+        mapData, meta = load()
+        for costModel in costModels:
+            key = f"{name}/{costModel}"
+            result = runCase(mapData, meta, costModel, memory)
+            report["results"][key] = result
+            log(f"{key:28s} {result['wallTime']:8.3f}s  nodes={result['nodesExpanded']:<8d} "
+                f"cost={result['routeCost']}  valid={result['valid']}")
+    return report
+
+def compare(report, baseline, tolerance=TIME_TOLERANCE):
+    """
+    Regression messages: slower, more nodes, different cost, now invalid,
+    or no route at all (out of budget or none found)
+    """
+    problems = []
+    for key, new in report["results"].items():
+        if new.get("outOfBudget"):
+            problems.append(f"{key}: search ran out of budget")
+        elif not new["found"]:
+            problems.append(f"{key}: no route found")
+    for key, old in baseline["results"].items():
+        new = report["results"].get(key)
+        if new is None:
+            continue
+        if new["wallTime"] > old["wallTime"] * (1 + tolerance):
+            problems.append(f"{key}: wall time {old['wallTime']:.3f}s -> {new['wallTime']:.3f}s")
+        if new["nodesExpanded"] > old["nodesExpanded"]:
+            problems.append(f"{key}: nodes expanded {old['nodesExpanded']} -> {new['nodesExpanded']}")
+        if old["routeCost"] is not None and (new["routeCost"] is None
+                                             or new["routeCost"] > old["routeCost"] + 1e-6):
+            problems.append(f"{key}: route cost {old['routeCost']} -> {new['routeCost']}")
+        if old["valid"] and not new["valid"]:
+            problems.append(f"{key}: route no longer valid")
+    return problems
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark Pathfinder")
+    parser.add_argument("--sizes", type=int, nargs="*", default=SYNTHETIC_SIZES,
+                        help="synthetic grid sizes (default: %(default)s)")
+    parser.add_argument("--cost", nargs="*", default=["hops", "time"], choices=["hops", "time"],
+                        help="cost models to run")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc runs")
+    parser.add_argument("--out", default="bench_report.json", help="report file")
+    parser.add_argument("--baseline", help="baseline report to compare against")
+    parser.add_argument("--save-baseline", help="also write the report here as the new baseline")
+    args = parser.parse_args()
+
+    report = runBenchmarks(args.sizes, args.cost, not args.no_memory)
+    with open(args.out, "w") as f:
+        json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            problems = compare(report, json.load(f))
+        for problem in problems:
+            print(f"REGRESSION {problem}")
+        if problems:
+            raise SystemExit(1)
+        print("No regressions against baseline")
+
+if __name__ == "__main__":
+    main()
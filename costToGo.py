@@ -0,0 +1,164 @@
+"""
+Cost-to-go field for a fixed finish.
+
+One backwards Dijkstra from the finish, over the reversed move graph, gives
+for every cell the cost of the best route to the finish and the first
+heading of that route. Any start (a boat joining late, or one that drifted
+off its route) is then routed by following the field, in O(route length).
+
+Legality is taken from the Pathfinder move tables, so as in checkValidMove
+a move is allowed by the wind at the cell it leaves from.
+"""
+import heapq
+import math
+import os
+
+import numpy as np
+
+from ai import ALLOWED_MOVES, HEADING_OFFSETS, HEADINGS, NO_HEADING, headingsToRoute
+from readMap import mapHash
+
+class CostToGoField:
+    """
+    cost[r, c, k]         cost from array cell (r, c) to the finish
+    bestHeading[r, c, k]  index into HEADINGS of the first move, -1 if none
+    k is the arriving heading index (NO_HEADING before the first move) when
+    the cost model charges for turns, and always 0 otherwise.
+    """
+    def __init__(self, finishPos, cost, bestHeading):
+        self.finishPos = list(finishPos)
+        self.cost = cost
+        self.bestHeading = bestHeading
+        self.rows, self.cols, slots = cost.shape
+        self.usesHeading = slots > 1
+
+    def startSlot(self, heading=None):
+        if not self.usesHeading:
+            return 0
+        return NO_HEADING if heading is None else HEADINGS.index(heading)
+
+    def costFrom(self, startPos, heading=None):
+        """Cost of the best route from startPos, or inf if there is none"""
+        y, x = startPos
+        return float(self.cost[self.rows - y, x - 1, self.startSlot(heading)])
+
+    def routeHeadings(self, startPos, heading=None):
+        """Headings of the best route from startPos, or None if there is none"""
+        y, x = startPos
+        slot = self.startSlot(heading)
+        if math.isinf(self.cost[self.rows - y, x - 1, slot]):
+            return None
+        path = []
+        while [y, x] != self.finishPos:
+            i = int(self.bestHeading[self.rows - y, x - 1, slot])
+            heading = HEADINGS[i]
+            vector, _ = ALLOWED_MOVES[heading]
+            y += vector[0]
+            x += vector[1]
+            path.append(heading)
+            if self.usesHeading:
+                slot = i
+        return path
+
+    def route(self, startPos, heading=None):
+        """Best route from startPos in the route.txt compass format"""
+        path = self.routeHeadings(startPos, heading)
+        if path is None:
+            return None
+        return headingsToRoute(path)
+
+    def save(self, path):
+        np.savez(path, finishPos=self.finishPos, cost=self.cost, bestHeading=self.bestHeading)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["finishPos"].tolist(), data["cost"], data["bestHeading"])
+
+def buildCostToGo(pathfinder, finishPos=None):
+    """Run the backwards Dijkstra from finishPos (default: the map finish)"""
+    if pathfinder.times is not None:
+        raise ValueError("Cost-to-go fields need a static wind map")
+    finishPos = list(finishPos or pathfinder.endPos)
+    rows, cols = pathfinder.rows, pathfinder.cols
+    pathfinder.buildMoveTables()
+    legal = pathfinder.legalMoves.tolist()
+    edge = pathfinder.edgeCosts.tolist()
+
+    usesHeading = pathfinder.costModel.usesHeading
+    slots = NO_HEADING + 1 if usesHeading else 1
+    turn = pathfinder.costModel.turnTable()
+
+    cost = np.full((rows, cols, slots), np.inf)
+    bestHeading = np.full((rows, cols, slots), -1, dtype=np.int8)
+
+    gr, gc = rows - finishPos[0], finishPos[1] - 1
+    cost[gr, gc, :] = 0
+    frontier = [(0.0, gr, gc, k) for k in range(slots)]
+    done = set()
+
+    while frontier:
+        g, r, c, k = heapq.heappop(frontier)
+        if (r, c, k) in done:
+            continue
+        done.add((r, c, k))
+
+        # Moves that end here: with headings every slot but NO_HEADING was
+        # reached by exactly one heading, without them by any heading
+        if usesHeading:
+            if k == NO_HEADING:
+                continue
+            arriving = [k]
+        else:
+            arriving = range(len(HEADINGS))
+
+        for i in arriving:
+            dr, dc = HEADING_OFFSETS[i]
+            pr, pc = r - dr, c - dc
+            if not (0 <= pr < rows and 0 <= pc < cols) or not legal[pr][pc] >> i & 1:
+                continue
+            move_cost = g + edge[pr][pc][i]
+            for p in range(slots):
+                new_cost = move_cost + (turn[p][i] if usesHeading else 0)
+                if new_cost < cost[pr, pc, p]:
+                    cost[pr, pc, p] = new_cost
+                    bestHeading[pr, pc, p] = i
+                    heapq.heappush(frontier, (new_cost, pr, pc, p))
+
+    return CostToGoField(finishPos, cost, bestHeading)
+
+def costToGo(pathfinder, finishPos=None, cacheDir=None):
+    """
+    buildCostToGo, cached on disk in cacheDir (if given) under a hash of the
+    wind grids, the finish and the cost model.
+    """
+    finishPos = list(finishPos or pathfinder.endPos)
+    if cacheDir is None:
+        return buildCostToGo(pathfinder, finishPos)
+
+    key = mapHash(pathfinder.mapData, finishPos, pathfinder.costModel.key())
+    path = os.path.join(cacheDir, f"costToGo_{key}.npz")
+    if os.path.exists(path):
+        return CostToGoField.load(path)
+    field = buildCostToGo(pathfinder, finishPos)
+    os.makedirs(cacheDir, exist_ok=True)
+    field.save(path)
+    return field
+
+if __name__ == "__main__":
+    import argparse
+    from ai import Pathfinder, readMap
+
+    parser = argparse.ArgumentParser(description="Route from any start using a cost-to-go field")
+    parser.add_argument("map", help="map name, e.g. map_2_Main")
+    parser.add_argument("--cost", choices=["hops", "time"], default="hops", help="cost model")
+    parser.add_argument("--start", type=int, nargs=2, metavar=("Y", "X"), help="start cell (default: map start)")
+    parser.add_argument("--cache", default=None, help="directory to cache the field in")
+    args = parser.parse_args()
+
+    mapData, meta = readMap(args.map)
+    pathfinder = Pathfinder(mapData, meta, args.cost)
+    field = costToGo(pathfinder, cacheDir=args.cache)
+    start = args.start or meta["startPos"]
+    print(f"Cost from {start}: {field.costFrom(start):.2f}")
+    print(field.route(start))
@@ -0,0 +1,215 @@
+"""
+Courses: routes through an ordered list of marks.
+
+Each leg (mark to next mark) is solved with an isochrone wavefront from the
+first mark, once per heading the boat may arrive at it with, giving the
+cost and route of the leg for every (arriving heading, leaving heading)
+pair. A pass over the legs then picks the cheapest chain, so turns made
+while rounding a mark are costed like any other turn in the time model.
+
+Legs do not depend on each other, so they are solved in parallel in a
+pool of worker processes sharing the wind grids (see batch.py), and kept
+per (from mark, to mark, arriving heading): moving one mark only re-solves
+the two legs next to it. Pass a RouteCache to keep solved legs across runs.
+
+    solver = CourseSolver(mapData, meta, "time", workers=4)
+    route = solver.solve([[30, 1], [15, 12], [1, 20]])
+    solver.close()
+
+    python course.py map_2_Main --marks 30 1 15 12 1 20 --cost time
+"""
+import argparse
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from ai import HEADINGS, NO_HEADING, Pathfinder, headingsToRoute, readMap, writeRoute
+from batch import attachWind, mapExtras, shareWind
+from isochrone import buildIsochrones
+from routeCache import RouteCache
+
+# Per-process state set up by initWorker
+_worker = {}
+
+def initWorker(specs, extras, meta, costModel):
+    mapData, blocks = attachWind(specs)
+    mapData.update(extras)
+    _worker["blocks"] = blocks
+    _worker["pathfinder"] = Pathfinder(mapData, meta, costModel)
+
+def solveLeg(pathfinder, start, finish, slot):
+    """
+    Leg from start, arrived at with heading index slot (NO_HEADING for a
+    boat that has not moved, 0 when turns are free), to finish. Returns,
+    per arriving slot at finish, the cost (inf if unreachable) and headings.
+    """
+    heading = None if slot == NO_HEADING or not pathfinder.costModel.usesHeading else HEADINGS[slot]
+    field = buildIsochrones(pathfinder, start, startHeading=heading)
+    y, x = finish
+    costs = field.arrival[field.rows - y, x - 1].tolist()
+    paths = [None if math.isinf(cost) else field.routeHeadings(finish, k)
+             for k, cost in enumerate(costs)]
+    return costs, paths
+
+def solveLegTask(task):
+    return solveLeg(_worker["pathfinder"], *task)
+
+class CourseSolver:
+    def __init__(self, mapData, meta, costModel=None, workers=1, routeCache=None):
+        self.mapData = mapData
+        self.meta = meta
+        self.pathfinder = Pathfinder(mapData, meta, costModel)
+        self.costModel = self.pathfinder.costModel
+        if self.pathfinder.times is not None:
+            raise ValueError("Courses need a static wind map")
+        self.workers = workers or os.cpu_count()
+        self.pool = None
+        self.blocks = []
+
+        # Solved legs by (start, finish, arriving slot); routeCache keeps
+        # them across runs under its route keys
+        self.legs = {}
+        self.routeCache = routeCache
+        self.cacheMapKey = None
+        self.stats = {}
+
+    def startPool(self):
+        extras = mapExtras(self.mapData)
+        self.blocks, specs = shareWind(self.mapData)
+        self.pool = ProcessPoolExecutor(self.workers, initializer=initWorker,
+                                        initargs=(specs, extras, self.meta, self.costModel))
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.shutdown()
+            self.pool = None
+        for shm in self.blocks:
+            shm.close()
+            shm.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def legKey(self, start, finish, slot):
+        if self.cacheMapKey is None:
+            meta = {k: v for k, v in self.meta.items() if k not in ("startPos", "finishPos")}
+            self.cacheMapKey = self.routeCache.mapKey(self.mapData, meta, self.costModel.key(), "leg")
+        return self.routeCache.routeKey(f"{self.cacheMapKey}:{slot}", start, finish)
+
+    def cachedLeg(self, task):
+        """(costs, paths) of a (start, finish, slot) leg if it was solved before"""
+        if task not in self.legs and self.routeCache is not None:
+            entry = self.routeCache.get(self.legKey(*task))
+            if entry is not None:
+                costs = [math.inf if cost is None else cost for cost in entry["cost"]]
+                self.legs[task] = (costs, entry["path"])
+        return self.legs.get(task)
+
+    def solveLegs(self, tasks):
+        """Solve (start, finish, slot) legs, in parallel when there are several"""
+        if self.workers > 1 and len(tasks) > 1:
+            if self.pool is None:
+                self.startPool()
+            results = self.pool.map(solveLegTask, tasks)
+        else:
+            results = (solveLeg(self.pathfinder, *task) for task in tasks)
+        for task, (costs, paths) in zip(tasks, results):
+            self.legs[task] = (costs, paths)
+            if self.routeCache is not None:
+                self.routeCache.put(self.legKey(*task), paths,
+                                    [None if math.isinf(cost) else cost for cost in costs], {})
+
+    def solve(self, waypoints):
+        """
+        Route through waypoints (a list of [y, x] marks, start first and
+        finish last) in the route.txt format, or None if some leg cannot be
+        sailed. Cost, leg counts and timing are left in self.stats.
+        """
+        t0 = time.perf_counter()
+        waypoints = [tuple(mark) for mark in waypoints]
+        if len(waypoints) < 2:
+            raise ValueError("A course needs at least a start and a finish")
+        for y, x in waypoints:
+            if not (1 <= y <= self.pathfinder.rows and 1 <= x <= self.pathfinder.cols):
+                raise ValueError(f"Mark [{y}, {x}] is off the map")
+        usesHeading = self.costModel.usesHeading
+        legs = list(zip(waypoints, waypoints[1:]))
+
+        # Every leg after the first can be entered with any heading
+        first_slot = NO_HEADING if usesHeading else 0
+        later_slots = range(NO_HEADING) if usesHeading else [0]
+        needed = list(dict.fromkeys((start, finish, slot) for n, (start, finish) in enumerate(legs)
+                                    for slot in ([first_slot] if n == 0 else later_slots)))
+        missing = [task for task in needed if self.cachedLeg(task) is None]
+        cached = len(needed) - len(missing)
+        self.solveLegs(missing)
+
+        # Cheapest chain of legs: best[slot] is (cost, headings so far) for
+        # arriving at the current mark with that slot
+        best = {first_slot: (0.0, [])}
+        for start, finish in legs:
+            arrived = {}
+            for slot, (cost_so_far, path_so_far) in best.items():
+                task = (start, finish, slot)
+                if self.cachedLeg(task) is None:
+                    # Only a mark the boat is still sitting on is left with no heading
+                    self.solveLegs([task])
+                    missing.append(task)
+                costs, paths = self.legs[task]
+                for k, cost in enumerate(costs):
+                    total = cost_so_far + cost
+                    if math.isfinite(total) and total < arrived.get(k, (math.inf,))[0]:
+                        arrived[k] = (total, path_so_far + paths[k])
+            best = arrived
+            if not best:
+                break
+
+        cost, path = min(best.values(), key=lambda entry: entry[0], default=(None, None))
+        self.stats = {
+            "legs": len(legs),
+            "legsSolved": len(missing),
+            "legsCached": cached,
+            "found": path is not None,
+            "routeLength": None if path is None else len(path),
+            "routeCost": cost,
+            "time": time.perf_counter() - t0,
+        }
+        return None if path is None else headingsToRoute(path)
+
+def main():
+    parser = argparse.ArgumentParser(description="Plan a route through an ordered list of marks")
+    parser.add_argument("map", help="map name, e.g. map_2_Main")
+    parser.add_argument("--marks", type=int, nargs="+", metavar="Y X",
+                        help="marks as Y X pairs, start first (default: map start and finish)")
+    parser.add_argument("--cost", choices=["hops", "time"], default="hops", help="cost model")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--cache", default=None, help="directory to cache solved legs in")
+    parser.add_argument("--out", default="route.txt", help="route file to write")
+    args = parser.parse_args()
+
+    mapData, meta = readMap(args.map)
+    if args.marks is None:
+        marks = [meta["startPos"], meta["finishPos"]]
+    elif len(args.marks) % 2:
+        parser.error("--marks takes Y X pairs")
+    else:
+        marks = [args.marks[i:i + 2] for i in range(0, len(args.marks), 2)]
+
+    cache = RouteCache(args.cache) if args.cache else None
+    with CourseSolver(mapData, meta, args.cost, args.workers, cache) as solver:
+        route = solver.solve(marks)
+    stats = solver.stats
+    if route is None:
+        print(f"No route through {marks}")
+        return
+    writeRoute(route, args.out)
+    print(f"{stats['legs']} legs, {stats['routeLength']} moves, cost {stats['routeCost']:.2f} "
+          f"({stats['legsSolved']} leg solves, {stats['legsCached']} cached) -> {args.out}")
+
+if __name__ == "__main__":
+    main()
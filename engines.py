@@ -0,0 +1,724 @@
+"""
+Alternative search engines for Pathfinder, selected with
+Pathfinder(..., engine="bidirectional"), "jump" or "anytime". All work on
+the static move tables, in array layout, and return optimal routes given
+the budget to finish.
+
+bidirectional  A* from both ends at once; expands fewer states than A* on
+               the shipped maps when turns cost time, but can expand more
+               on large maps of smoothly varying wind.
+jump           Prunes symmetric orderings of the same moves in regions of
+               uniform wind and jumps along straight runs. Only pays off
+               on maps with wide stretches of exactly uniform wind, so on
+               any other map it falls back to A* (see JUMP_MIN_UNIFORM),
+               and it is not one of the general SEARCH_ENGINES choices.
+anytime        ARA*: a quick weighted A* route first, then better ones with
+               a proven bound on how far from optimal they are, for as long
+               as the time or expansion budget lasts.
+
+Each engine takes the Pathfinder and returns (headings, cost, counters)
+like Pathfinder.searchAStar. searchTiled is the "astar" engine on tiled
+maps (readMap.readTiledMap), which have no whole-map move tables.
+"""
+import heapq
+import math
+import time
+import warnings
+
+import numpy as np
+
+from ai import HEADING_OFFSETS, HEADINGS, MASK_INDICES, NO_HEADING, Node, min_moves
+
+def staticTables(pathfinder):
+    """The fully built move tables of a static map"""
+    if pathfinder.times is not None:
+        raise ValueError(f"The {pathfinder.engine} engine needs a static wind map")
+    if pathfinder.tiles is not None:
+        raise ValueError(f"The {pathfinder.engine} engine needs whole-map move tables, not a tiled map")
+    pathfinder.buildMoveTables()
+    return pathfinder.legalMoves, pathfinder.edgeCosts
+
+def endpoints(pathfinder):
+    """Start and finish cells in array layout"""
+    rows = pathfinder.rows
+    (sy, sx), (gy, gx) = pathfinder.startPos, pathfinder.endPos
+    return (rows - sy, sx - 1), (rows - gy, gx - 1)
+
+def searchBidirectional(pathfinder):
+    """
+    Bidirectional A*: a forward search from the start and a backward search
+    from the finish over the reversed move graph, expanding whichever side
+    has the smaller open list.
+
+    A move's legality and cost depend on the cell it leaves, so backward
+    states are keyed by the heading the boat leaves a cell with (when turns
+    cost time) and each predecessor is checked against its own move tables.
+    A forward state (arrived with k) and a backward state (leaving with i)
+    at the same cell join up at the cost of the k -> i turn.
+
+    Both sides use the same potential, half the difference of the forward
+    and backward min_moves bounds, so they search one graph of reduced move
+    costs and can stop as soon as the best joined route is no dearer than
+    the two smallest open keys together.
+    """
+    t0 = time.perf_counter()
+    legal, edge = staticTables(pathfinder)
+    rows, cols = pathfinder.rows, pathfinder.cols
+    usesHeading = pathfinder.costModel.usesHeading
+    turn = pathfinder.costModel.turnTable()
+    lower = pathfinder.minMoveCost
+    (sr, sc), (gr, gc) = endpoints(pathfinder)
+    slots = range(NO_HEADING + 1) if usesHeading else [0]
+
+    def successors(state):
+        r, c, k = state
+        costs = edge[r, c].tolist()
+        for i in MASK_INDICES[legal[r, c]]:
+            dr, dc = HEADING_OFFSETS[i]
+            if usesHeading:
+                yield (r + dr, c + dc, i), i, costs[i] + turn[k][i]
+            else:
+                yield (r + dr, c + dc, 0), i, costs[i]
+
+    def predecessors(state):
+        r, c, i = state
+        for j in range(len(HEADINGS)):
+            dr, dc = HEADING_OFFSETS[j]
+            pr, pc = r - dr, c - dc
+            if not (0 <= pr < rows and 0 <= pc < cols) or not legal[pr, pc] >> j & 1:
+                continue
+            cost = float(edge[pr, pc, j])
+            if usesHeading:
+                yield (pr, pc, j), j, cost + junction(j, i)
+            else:
+                yield (pr, pc, 0), j, cost
+
+    def junction(k, i):
+        """Cost of joining a boat that arrived with k to one leaving with i"""
+        if not usesHeading or i == NO_HEADING:
+            return 0
+        return turn[k][i]
+
+    def potential(r, c):
+        """Average of the forward and backward heuristics, halved"""
+        return (min_moves(r, c, gr, gc) - min_moves(sr, sc, r, c)) * lower / 2
+
+    expand = [successors, predecessors]
+    sign = [1, -1]
+
+    # Per direction: best g, parent links, closed states and an open heap of
+    # (g +/- potential, -g, order, state). Forward parents point back towards
+    # the start, backward ones towards the finish; both store the heading of
+    # the move in between.
+    g = [{}, {}]
+    parent = [{}, {}]
+    closed = [set(), set()]
+    frontier = [[], []]
+
+    # The finish is a backward state with no heading to leave on
+    start = (sr, sc, NO_HEADING if usesHeading else 0)
+    finish = (gr, gc, NO_HEADING if usesHeading else 0)
+    for side, state in ((0, start), (1, finish)):
+        g[side][state] = 0
+        heapq.heappush(frontier[side], (sign[side] * potential(state[0], state[1]), 0, side, state))
+    order = 1
+
+    best, meet = (0, (start, finish)) if start[:2] == finish[:2] else (math.inf, None)
+    expanded = [0, 0]
+    stale = 0
+    frontier_peak = 2
+    max_expansions = math.inf if pathfinder.maxExpansions is None else pathfinder.maxExpansions
+    deadline = None if pathfinder.timeLimit is None else t0 + pathfinder.timeLimit
+    out_of_budget = False
+
+    while frontier[0] and frontier[1]:
+        if best <= frontier[0][0][0] + frontier[1][0][0]:
+            break
+        if (expanded[0] + expanded[1] >= max_expansions
+                or (deadline is not None and time.perf_counter() > deadline)):
+            out_of_budget = True
+            break
+
+        side = 0 if len(frontier[0]) <= len(frontier[1]) else 1
+        _, _, _, state = heapq.heappop(frontier[side])
+        if state in closed[side]:
+            stale += 1
+            continue
+        closed[side].add(state)
+        expanded[side] += 1
+
+        g_side, g_other = g[side], g[1 - side]
+        base = g_side[state]
+        for next_state, i, cost in expand[side](state):
+            if next_state in closed[side]:
+                continue
+            new_g = base + cost
+            if new_g >= g_side.get(next_state, math.inf):
+                continue
+            g_side[next_state] = new_g
+            parent[side][next_state] = (state, i)
+            order += 1
+            r, c, k = next_state
+            key = new_g + sign[side] * potential(r, c)
+            heapq.heappush(frontier[side], (key, -new_g, order, next_state))
+
+            # Join up with every state the other side has reached here
+            for other in slots:
+                other_g = g_other.get((r, c, other))
+                if other_g is None:
+                    continue
+                if side == 0:
+                    joined = new_g + junction(k, other) + other_g
+                    pair = (next_state, (r, c, other))
+                else:
+                    joined = other_g + junction(other, k) + new_g
+                    pair = ((r, c, other), next_state)
+                if joined < best:
+                    best, meet = joined, pair
+        frontier_peak = max(frontier_peak, len(frontier[0]) + len(frontier[1]))
+
+    counters = {
+        "nodesExpanded": expanded[0] + expanded[1],
+        "forwardExpanded": expanded[0],
+        "backwardExpanded": expanded[1],
+        "nodesGenerated": order,
+        "staleEntries": stale,
+        "reopenings": 0,
+        "frontierPeak": frontier_peak,
+        "frontierSize": len(frontier[0]) + len(frontier[1]),
+        "outOfBudget": out_of_budget,
+    }
+    # A route joined up before the budget ran out is not proven optimal
+    if meet is None or out_of_budget:
+        return None, None, counters
+
+    forward, backward = meet
+    path = []
+    state = forward
+    while state in parent[0]:
+        state, i = parent[0][state]
+        path.append(HEADINGS[i])
+    path.reverse()
+    state = backward
+    while state in parent[1]:
+        state, i = parent[1][state]
+        path.append(HEADINGS[i])
+    return path, best, counters
+
+def bits(mask):
+    """Heading indices (NO_HEADING included) set in a bitmask"""
+    return [k for k in range(NO_HEADING + 1) if mask >> k & 1]
+
+def wind_classes(legal, edge):
+    """
+    Label every cell so that two cells share a label exactly when they have
+    the same legal moves and the same move costs (bounds included, since
+    they shape the legal moves).
+    """
+    rows, cols = legal.shape
+    keys = np.concatenate([legal.reshape(-1, 1).astype(np.float32),
+                           edge.reshape(rows * cols, -1)], axis=1)
+    _, labels = np.unique(keys, axis=0, return_inverse=True)
+    return labels.reshape(rows, cols)
+
+# Share of cells that must have the same moves and costs as all their
+# neighbours for the jump engine to run rather than fall back to A*. Even
+# 90% uniform smooth wind leaves it slower than A*, so this asks for wind
+# that is uniform all but everywhere.
+JUMP_MIN_UNIFORM = 0.99
+
+def uniformShare(legal, edge):
+    """
+    Share of cells whose legal moves and costs equal every neighbour's,
+    among the cells at least two from the edge (the map bounds shape the
+    legal moves next to it)
+    """
+    rows, cols = legal.shape
+    uniform = np.ones((rows, cols), dtype=bool)
+    for dr, dc in HEADING_OFFSETS:
+        # Cell (r, c) against (r + dr, c + dc), where that is on the map
+        r0, r1 = max(0, -dr), rows - max(0, dr)
+        c0, c1 = max(0, -dc), cols - max(0, dc)
+        here = (slice(r0, r1), slice(c0, c1))
+        there = (slice(r0 + dr, r1 + dr), slice(c0 + dc, c1 + dc))
+        same = (legal[here] == legal[there]) & (edge[here] == edge[there]).all(axis=-1)
+        uniform[here] &= same
+    inner = uniform[2:-2, 2:-2]
+    return float(inner.mean()) if inner.size else 0.0
+
+def searchJump(pathfinder):
+    """
+    A* with jump-point style pruning for the hex move set.
+
+    In a region of uniform wind, moves commute: p -k-> n -i-> m costs the
+    same as p -i-> q -k-> m. So when p, n and q share a wind class, the
+    move i from n (reached by k) is pruned whenever i comes before k in
+    HEADINGS order; some optimal route always survives, namely the one with
+    the moves of each uniform stretch sorted. Where a state then has only
+    one move left, continuing straight, the search jumps along it without
+    queueing the cells in between, and drops dead ends outright.
+
+    Needs a cost model without turn penalties, since turns make the order
+    of moves matter. Cells only share a wind class when their moves and
+    costs are exactly equal, so unless at least JUMP_MIN_UNIFORM of the map
+    is uniform this runs Pathfinder.searchAStar instead, with jumpFallback
+    set in the counters.
+    """
+    if pathfinder.costModel.usesHeading:
+        raise ValueError("The jump engine needs a cost model without turn penalties")
+    t0 = time.perf_counter()
+    legal, edge = staticTables(pathfinder)
+    uniform = uniformShare(legal, edge)
+    if uniform < JUMP_MIN_UNIFORM:
+        path, cost, counters = pathfinder.searchAStar()
+        return path, cost, {**counters, "jumpFallback": True, "uniformShare": uniform}
+    rows, cols = pathfinder.rows, pathfinder.cols
+    lower = pathfinder.minMoveCost
+    (sr, sc), (gr, gc) = endpoints(pathfinder)
+    cls = wind_classes(legal, edge).tolist()
+    legal = legal.tolist()
+
+    def movesFrom(r, c, k):
+        """Headings kept at (r, c) after arriving with heading k"""
+        moves = MASK_INDICES[legal[r][c]]
+        if k == NO_HEADING:
+            return moves
+        dr, dc = HEADING_OFFSETS[k]
+        pr, pc = r - dr, c - dc
+        here = cls[r][c]
+        if cls[pr][pc] != here:
+            return moves
+        kept = []
+        for i in moves:
+            if i < k:
+                qr, qc = pr + HEADING_OFFSETS[i][0], pc + HEADING_OFFSETS[i][1]
+                if 0 <= qr < rows and 0 <= qc < cols and cls[qr][qc] == here:
+                    continue
+            kept.append(i)
+        return kept
+
+    # States are cells. A cell reached by several headings at the same best
+    # cost keeps all of them, since each one prunes a different set of moves;
+    # arriving[cell] and expanded[cell] are bitmasks over the heading index.
+    start = (sr, sc)
+    best_g = {start: 0}
+    arriving = {start: 1 << NO_HEADING}
+    expanded = {}
+    parent = {}  # cell -> (previous queued cell, heading index, moves in a row)
+    frontier = [(min_moves(sr, sc, gr, gc) * lower, 0, 0, start)]
+    order = 0
+    expansions = 0
+    reopened = 0
+    stale = 0
+    jumped = 0
+    frontier_peak = 1
+    found = False
+    max_expansions = math.inf if pathfinder.maxExpansions is None else pathfinder.maxExpansions
+    deadline = None if pathfinder.timeLimit is None else t0 + pathfinder.timeLimit
+    out_of_budget = False
+
+    while frontier:
+        if expansions >= max_expansions or (deadline is not None and time.perf_counter() > deadline):
+            out_of_budget = True
+            break
+        _, _, _, cell = heapq.heappop(frontier)
+        new = arriving[cell] & ~expanded.get(cell, 0)
+        if not new:
+            stale += 1
+            continue
+        if cell in expanded:
+            reopened += 1
+        expanded[cell] = arriving[cell]
+        expansions += 1
+        r, c = cell
+        if cell == (gr, gc):
+            found = True
+            break
+
+        # Moves not already tried from this cell under an earlier heading
+        done = set()
+        for k in bits(expanded[cell] ^ new):
+            done.update(movesFrom(r, c, k))
+        moves = []
+        for k in bits(new):
+            moves.extend(i for i in movesFrom(r, c, k) if i not in done and i not in moves)
+
+        base = best_g[cell]
+        costs = edge[r, c].tolist()
+        for i in moves:
+            dr, dc = HEADING_OFFSETS[i]
+            nr, nc = r + dr, c + dc
+            new_g = base + costs[i]
+            steps = 1
+
+            # Jump while the only move left is to carry straight on
+            while (nr, nc) != (gr, gc):
+                kept = movesFrom(nr, nc, i)
+                if kept != [i]:
+                    break
+                new_g += float(edge[nr, nc, i])
+                nr, nc = nr + dr, nc + dc
+                steps += 1
+                jumped += 1
+            else:
+                kept = None
+            if kept == []:
+                continue  # dead end
+
+            next_cell = (nr, nc)
+            old_g = best_g.get(next_cell, math.inf)
+            if new_g > old_g:
+                continue
+            if new_g == old_g:
+                if arriving[next_cell] >> i & 1:
+                    continue
+                arriving[next_cell] |= 1 << i
+            else:
+                best_g[next_cell] = new_g
+                arriving[next_cell] = 1 << i
+                parent[next_cell] = (cell, i, steps)
+            order += 1
+            f = new_g + min_moves(nr, nc, gr, gc) * lower
+            heapq.heappush(frontier, (f, -new_g, order, next_cell))
+        frontier_peak = max(frontier_peak, len(frontier))
+
+    counters = {
+        "nodesExpanded": expansions,
+        "nodesGenerated": order,
+        "jumpedCells": jumped,
+        "jumpFallback": False,
+        "uniformShare": uniform,
+        "staleEntries": stale,
+        "reopenings": reopened,
+        "frontierPeak": frontier_peak,
+        "frontierSize": len(frontier),
+        "outOfBudget": out_of_budget,
+    }
+    if not found:
+        return None, None, counters
+
+    path = []
+    cell = (gr, gc)
+    while cell in parent:
+        cell, i, steps = parent[cell]
+        path.extend([HEADINGS[i]] * steps)
+    path.reverse()
+    return path, best_g[(gr, gc)], counters
+
+# First inflation of the anytime engine when Pathfinder.weight is 1 (high,
+# since the time model's heuristic is weak), the share of eps - 1 kept after
+# every pass, and how close to 1 it gets before the last, optimal pass
+ANYTIME_WEIGHT = 10.0
+ANYTIME_DECAY = 0.5
+ANYTIME_FINAL = 1.1
+
+def searchAnytime(pathfinder):
+    """
+    Anytime repairing A* (ARA*): a weighted A* pass with the heuristic
+    inflated by eps finds a first route quickly, then eps is lowered pass
+    by pass down to 1, each pass reusing the previous search and only
+    re-expanding states whose cost improved.
+
+    After every pass the best route so far and its proven bound (route cost
+    over the smallest g + h still open, which no route can beat) go to
+    observer.routeImproved and counters["improvements"]. When maxExpansions
+    or timeLimit runs out the best route so far is returned, with
+    outOfBudget set; otherwise the last pass at eps 1 makes it optimal.
+    """
+    t0 = time.perf_counter()
+    legal, edge = staticTables(pathfinder)
+    usesHeading = pathfinder.costModel.usesHeading
+    turn = pathfinder.costModel.turnTable()
+    lower = pathfinder.minMoveCost
+    (sr, sc), (gr, gc) = endpoints(pathfinder)
+    observer = pathfinder.observer
+    max_expansions = math.inf if pathfinder.maxExpansions is None else pathfinder.maxExpansions
+    deadline = None if pathfinder.timeLimit is None else t0 + pathfinder.timeLimit
+
+    def heuristic(state):
+        return min_moves(state[0], state[1], gr, gc) * lower
+
+    # Parents point back towards the start along with the move heading.
+    # Goal-cell states are never expanded; reaching one updates the route.
+    start = (sr, sc, NO_HEADING if usesHeading else 0)
+    g = {start: 0}
+    parent = {}
+    opened = {start}
+    closed = set()
+    incons = set()
+    best, goal = (0, start) if (sr, sc) == (gr, gc) else (math.inf, None)
+
+    eps = pathfinder.weight if pathfinder.weight > 1 else ANYTIME_WEIGHT
+    order = 0
+    expanded = 0
+    stale = 0
+    reopened = 0
+    frontier_peak = 1
+    passes = 0
+    improvements = []
+    out_of_budget = False
+
+    while True:
+        passes += 1
+        frontier = [(g[s] + eps * heuristic(s), order, s) for s in opened]
+        heapq.heapify(frontier)
+        closed.clear()
+
+        # One weighted A* pass; it is done once no open state could lead to
+        # a route cheaper than the current one by more than eps allows
+        while frontier and best > frontier[0][0]:
+            if expanded >= max_expansions or (deadline is not None and time.perf_counter() > deadline):
+                out_of_budget = True
+                break
+            _, _, state = heapq.heappop(frontier)
+            if state not in opened:
+                stale += 1
+                continue
+            opened.discard(state)
+            closed.add(state)
+            expanded += 1
+
+            r, c, k = state
+            base = g[state]
+            costs = edge[r, c].tolist()
+            for i in MASK_INDICES[legal[r, c]]:
+                dr, dc = HEADING_OFFSETS[i]
+                next_state = (r + dr, c + dc, i if usesHeading else 0)
+                new_g = base + costs[i] + (turn[k][i] if usesHeading else 0)
+                if new_g >= g.get(next_state, math.inf):
+                    continue
+                g[next_state] = new_g
+                parent[next_state] = (state, i)
+                if next_state[:2] == (gr, gc):
+                    if new_g < best:
+                        best, goal = new_g, next_state
+                    continue
+                if next_state in closed:
+                    # Already expanded in this pass: wait for the next one
+                    incons.add(next_state)
+                    reopened += 1
+                    continue
+                opened.add(next_state)
+                order += 1
+                heapq.heappush(frontier, (new_g + eps * heuristic(next_state), order, next_state))
+            frontier_peak = max(frontier_peak, len(frontier))
+
+        # Every route still to be found passes through an open or
+        # inconsistent state, so none costs less than their smallest g + h;
+        # a completed pass also guarantees the eps bound of weighted A*
+        floor = min((g[s] + heuristic(s) for s in opened | incons), default=math.inf)
+        bound = 1.0 if floor >= best else best / floor if floor > 0 else math.inf
+        if not out_of_budget:
+            bound = min(bound, eps)
+        if goal is not None:
+            # Parents may have improved since the goal was reached, so the
+            # route is costed again on the way back
+            path = []
+            cost = 0
+            state = goal
+            while state in parent:
+                state, i = parent[state]
+                path.append(HEADINGS[i])
+                cost += float(edge[state[0], state[1], i]) + (turn[state[2]][i] if usesHeading else 0)
+            path.reverse()
+            best = min(best, float(cost))
+            if not improvements or best < improvements[-1]["cost"] or bound < improvements[-1]["bound"]:
+                improvements.append({
+                    "cost": best,
+                    "bound": bound,
+                    "weight": eps,
+                    "nodesExpanded": expanded,
+                    "time": time.perf_counter() - t0,
+                })
+                observer.routeImproved(path, best, bound)
+
+        if out_of_budget or eps <= 1 or bound <= 1:
+            break
+        eps = min(1 + (eps - 1) * ANYTIME_DECAY, bound)
+        if eps < ANYTIME_FINAL:
+            eps = 1.0
+        opened |= incons
+        incons.clear()
+
+    counters = {
+        "nodesExpanded": expanded,
+        "nodesGenerated": order,
+        "staleEntries": stale,
+        "reopenings": reopened,
+        "frontierPeak": frontier_peak,
+        "frontierSize": len(opened),
+        "passes": passes,
+        "outOfBudget": out_of_budget,
+        "improvements": improvements,
+    }
+    if goal is None:
+        return None, None, counters
+    return path, best, counters
+
+# Most memory the move tables of a tiled search may take (see searchTiled)
+TILE_TABLE_BYTES = 1 << 30
+
+def searchTiled(pathfinder):
+    """
+    Pathfinder.searchAStar for tiled maps: the same search, expanding the
+    same states in the same order, but with the search state in dicts
+    holding only the states reached, and the move tables of each tile built
+    when the search first reaches it (Pathfinder.tileTables). Memory
+    follows the area searched rather than the map.
+
+    The tables of every tile the frontier spans are kept, as any of them
+    may be needed on the next pop; with fewer, each pop would evict tables
+    needed again soon after. When the frontier spans more tiles than
+    Pathfinder.tileTableLimit, the limit grows to fit (with a warning), up
+    to TILE_TABLE_BYTES of tables, past which the search raises ValueError.
+
+    Counters add the tile cache hits, misses and evictions during the
+    search, the tile tables built, and the tile table limit at the end.
+    """
+    if pathfinder.times is not None:
+        raise ValueError("Tiled maps only hold static wind")
+    observer = pathfinder.observer
+    on_expand = observer.nodeExpanded if observer.expansionHooks else None
+    store = pathfinder.tiles
+    size = store.tileSize
+    tiles_before = dict(store.counters)
+    tables_built = 0
+    # Frontier entries per tile, and the most tile tables that fit the
+    # budget (a uint8 mask and six float32 costs per cell)
+    pending = {}
+    max_tables = max(1, TILE_TABLE_BYTES // (size * size * 25))
+    rows = pathfinder.rows
+    goal_y, goal_x = pathfinder.endPos
+    usesHeading = pathfinder.costModel.usesHeading
+    turn = pathfinder.costModel.turnTable()
+    weight = pathfinder.weight
+    heuristic = pathfinder.heuristic
+
+    # States are (array row, array col, slot) as in searchAStar; parent
+    # maps a state to (state it came from, heading index of the move)
+    start_y, start_x = pathfinder.startPos
+    start = (rows - start_y, start_x - 1, NO_HEADING if usesHeading else 0)
+    g_cost = {start: 0}
+    parent = {}
+    closed = set()
+    frontier = [(weight * heuristic(start_y, start_x), 0, start, 0)]
+    pending[(start[0] // size, start[1] // size)] = 1
+    order = 0
+    stale = 0
+    reopenings = 0
+    frontier_peak = 1
+
+    def nodeAt(state):
+        up, i = parent.get(state, (None, None))
+        node = Node(rows - state[0], state[1] + 1, None if up is None else nodeAt(up),
+                    None if i is None else HEADINGS[i], g_cost[state])
+        node.h_cost = heuristic(node.y, node.x)
+        node.f_cost = node.g_cost + node.h_cost
+        return node
+
+    iterations = 0
+    max_expansions = math.inf if pathfinder.maxExpansions is None else pathfinder.maxExpansions
+    deadline = None if pathfinder.timeLimit is None else time.perf_counter() + pathfinder.timeLimit
+    out_of_budget = False
+    goal = None
+    # Tables of the last tile used; consecutive states are mostly neighbours
+    tile = None
+
+    while frontier:
+        if iterations >= max_expansions or (deadline is not None and time.perf_counter() > deadline):
+            out_of_budget = True
+            break
+
+        _, _, state, g = heapq.heappop(frontier)
+        r, c, slot = state
+        here = (r // size, c // size)
+        pending[here] -= 1
+        if not pending[here]:
+            del pending[here]
+        if state in closed or g > g_cost[state]:
+            stale += 1
+            continue
+        iterations += 1
+
+        y, x = rows - r, c + 1
+        if y == goal_y and x == goal_x:
+            goal = state
+            break
+        closed.add(state)
+
+        if tile != here:
+            tile = here
+            if tile not in pathfinder.tileTableCache:
+                tables_built += 1
+            legal_table, edge_table = pathfinder.tileTables(*tile, keep=pending)
+        tr, tc = r % size, c % size
+        moves = MASK_INDICES[legal_table[tr, tc]]
+        edge_costs = edge_table[tr, tc].tolist()
+        turn_costs = turn[slot] if usesHeading else turn[NO_HEADING]
+
+        if on_expand is not None:
+            on_expand(nodeAt(state), [HEADINGS[i] for i in moves],
+                      iterations, len(frontier), len(closed))
+
+        for i in moves:
+            dr, dc = HEADING_OFFSETS[i]
+            next_state = (r + dr, c + dc, i if usesHeading else 0)
+            if next_state in closed:
+                continue
+            new_g_cost = g + edge_costs[i] + turn_costs[i]
+            old_g_cost = g_cost.get(next_state, math.inf)
+            if new_g_cost < old_g_cost:
+                if old_g_cost != math.inf:
+                    reopenings += 1
+                g_cost[next_state] = new_g_cost
+                parent[next_state] = (state, i)
+                order += 1
+                f_cost = new_g_cost + weight * heuristic(y - dr, x + dc)
+                heapq.heappush(frontier, (f_cost, order, next_state, new_g_cost))
+                there = ((r + dr) // size, (c + dc) // size)
+                pending[there] = pending.get(there, 0) + 1
+
+        # The frontier's tiles, and the one being expanded, must all fit
+        if len(pending) + 1 > pathfinder.tileTableLimit:
+            span = len(pending) + 1
+            if span > max_tables:
+                raise ValueError(f"Search frontier spans {span} tiles, more than the {max_tables} "
+                                 f"tiles of move tables that fit in TILE_TABLE_BYTES")
+            limit = min(max(span, 2 * pathfinder.tileTableLimit), max_tables)
+            warnings.warn(f"Search frontier spans {span} tiles; keeping move tables for "
+                          f"{limit} tiles instead of {pathfinder.tileTableLimit}", RuntimeWarning)
+            pathfinder.tileTableLimit = limit
+
+        if len(frontier) > frontier_peak:
+            frontier_peak = len(frontier)
+
+    counters = {
+        "nodesExpanded": iterations,
+        "nodesGenerated": order,
+        "staleEntries": stale,
+        "reopenings": reopenings,
+        "frontierPeak": frontier_peak,
+        "frontierSize": len(frontier),
+        "outOfBudget": out_of_budget,
+        "tileHits": store.counters["hits"] - tiles_before["hits"],
+        "tileMisses": store.counters["misses"] - tiles_before["misses"],
+        "tileEvictions": store.counters["evictions"] - tiles_before["evictions"],
+        "tileTablesBuilt": tables_built,
+        "tileTableLimit": pathfinder.tileTableLimit,
+    }
+    if goal is None:
+        return None, None, counters
+
+    path = []
+    state = goal
+    while state in parent:
+        state, i = parent[state]
+        path.append(HEADINGS[i])
+    path.reverse()
+    return path, g_cost[goal], counters
+
+ENGINES = {
+    "bidirectional": searchBidirectional,
+    "jump": searchJump,
+    "anytime": searchAnytime,
+}
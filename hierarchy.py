@@ -0,0 +1,386 @@
+"""
+Hierarchical (HPA*-style) planning for very large wind grids.
+
+The map is cut into square blocks of blockSize cells. Where moves cross
+from one block into the next, a few transition moves are kept per run of
+border cells (the middle one, plus both ends of long runs); their end
+cells are the nodes of an abstract graph. Within a block, nodes are
+joined by their exact full-resolution costs for paths that stay inside
+the block, worked out for a whole block at once the first time the
+abstract search reaches it, so only blocks near the route are costed.
+
+A route is planned in two passes: A* over the abstract graph, then A* at
+full resolution (turn penalties included) through the blocks that route
+touches, widened by corridorMargin blocks. The result is feasible but not
+always optimal; run this module to see how far it is from the exact
+search on the benchmark maps:
+
+    python hierarchy.py --sizes 100 500 --block 16
+"""
+import heapq
+import math
+import time
+
+import numpy as np
+
+from ai import (HEADING_OFFSETS, HEADINGS, MASK_INDICES, NO_HEADING, TABLE_BAND_ROWS,
+                headingsToRoute, min_moves)
+
+# Runs of border cells at least this long get a transition at each end as
+# well as in the middle
+LONG_ENTRANCE = 6
+
+class HierarchicalPlanner:
+    def __init__(self, pathfinder, blockSize=16, corridorMargin=1):
+        if pathfinder.times is not None:
+            raise ValueError("Hierarchical planning needs a static wind map")
+        t0 = time.perf_counter()
+        self.pathfinder = pathfinder
+        self.blockSize = blockSize
+        self.corridorMargin = corridorMargin
+        self.rows, self.cols = pathfinder.rows, pathfinder.cols
+        self.blockRows = -(-self.rows // blockSize)
+        self.blockCols = -(-self.cols // blockSize)
+
+        self.lower = pathfinder.minMoveCost
+
+        # Abstract graph: nodes[block] is the set of node cells in a block,
+        # links[cell] the transition moves out of a node as (cell, cost), and
+        # blockDist[block][cell] the in-block costs from a node, filled on demand
+        self.nodes = {}
+        self.links = {}
+        self.blockDist = {}
+        self.findTransitions()
+        self.stats = {"build": time.perf_counter() - t0}
+
+    def blockOf(self, r, c):
+        return (r // self.blockSize, c // self.blockSize)
+
+    def findTransitions(self):
+        """
+        Pick the transition moves between neighbouring blocks, building the
+        move tables and looking for crossings a band of rows at a time
+        """
+        B = self.blockSize
+        pathfinder = self.pathfinder
+        found = []
+        for band, built in enumerate(pathfinder.bandBuilt):
+            if not built:
+                pathfinder.buildMoveTables(band)
+            r0 = band * TABLE_BAND_ROWS
+            legal = pathfinder.legalMoves[r0:r0 + TABLE_BAND_ROWS]
+            rr, cc = np.indices(legal.shape)
+            rr += r0
+            for i in range(len(HEADINGS)):
+                dr, dc = HEADING_OFFSETS[i]
+                crossing = (legal >> i & 1).astype(bool)
+                crossing &= ((rr + dr) // B != rr // B) | ((cc + dc) // B != cc // B)
+                r, c = np.nonzero(crossing)
+                found.append(np.stack([r + r0, c, np.full(r.shape, i)], axis=1))
+        moves = np.concatenate(found)
+        if not len(moves):
+            return
+
+        # Group by (from block, to block); position along the shared border
+        # is the column for moves between block rows, else the row
+        r, c, i = moves.T
+        dr = np.array([d[0] for d in HEADING_OFFSETS])[i]
+        dc = np.array([d[1] for d in HEADING_OFFSETS])[i]
+        src = (r // B) * self.blockCols + c // B
+        dst = ((r + dr) // B) * self.blockCols + (c + dc) // B
+        along = np.where((r + dr) // B != r // B, c, r)
+        order = np.lexsort((along, dst, src))
+        moves, src, dst, along = moves[order], src[order], dst[order], along[order]
+
+        cost = pathfinder.edgeCosts[r, c, i][order].astype(np.float64)
+        # Runs: same block pair, border positions at most one apart
+        breaks = np.flatnonzero((src[1:] != src[:-1]) | (dst[1:] != dst[:-1])
+                                | (along[1:] - along[:-1] > 1)) + 1
+        bounds = np.concatenate(([0], breaks, [len(moves)])).tolist()
+        for start, end in zip(bounds[:-1], bounds[1:]):
+            positions = np.unique(along[start:end])
+            picks = {positions[len(positions) // 2]}
+            if len(positions) >= LONG_ENTRANCE:
+                picks.update((positions[0], positions[-1]))
+            for position in picks:
+                # Cheapest crossing move from the cell at this position
+                at = start + np.nonzero(along[start:end] == position)[0]
+                best = at[np.argmin(cost[at])]
+                a, b, k = moves[best].tolist()
+                self.addLink((a, b), (a + HEADING_OFFSETS[k][0], b + HEADING_OFFSETS[k][1]),
+                             float(cost[best]))
+
+    def addLink(self, u, v, cost):
+        for cell in (u, v):
+            self.nodes.setdefault(self.blockOf(*cell), set()).add(cell)
+        self.links.setdefault(u, []).append((v, cost))
+
+    def blockBounds(self, block):
+        B = self.blockSize
+        r0, c0 = block[0] * B, block[1] * B
+        return r0, c0, min(r0 + B, self.rows), min(c0 + B, self.cols)
+
+    def blockTables(self, block):
+        """
+        (row offset, col offset, legalMoves, edgeCosts) of one block, the
+        tables as nested lists for refine's inner loop
+        """
+        r0, c0, r1, c1 = self.blockBounds(block)
+        pathfinder = self.pathfinder
+        return (r0, c0, pathfinder.legalMoves[r0:r1, c0:c1].tolist(),
+                pathfinder.edgeCosts[r0:r1, c0:c1].tolist())
+
+    def costBlock(self, block, sources):
+        """
+        Costs from each source cell to every cell of a block, moving only
+        inside the block: a Bellman-Ford over all sources at once, relaxing
+        each heading as one array operation until nothing improves.
+        Returns a (len(sources), block height, block width) array.
+        """
+        r0, c0, r1, c1 = self.blockBounds(block)
+        h, w = r1 - r0, c1 - c0
+        cost = np.asarray(self.pathfinder.edgeCosts[r0:r1, c0:c1], dtype=np.float64)
+        dist = np.full((len(sources), h, w), np.inf)
+        for s, (r, c) in enumerate(sources):
+            dist[s, r - r0, c - c0] = 0
+
+        moves = []
+        for i, (dr, dc) in enumerate(HEADING_OFFSETS):
+            src = (slice(max(0, -dr), h - max(0, dr)), slice(max(0, -dc), w - max(0, dc)))
+            dst = (slice(max(0, dr), h + min(0, dr)), slice(max(0, dc), w + min(0, dc)))
+            moves.append((src, dst, cost[src + (i,)]))
+
+        changed = True
+        while changed:
+            changed = False
+            for src, dst, step in moves:
+                reached = dist[(slice(None),) + src] + step
+                target = dist[(slice(None),) + dst]
+                better = reached < target
+                if better.any():
+                    target[better] = reached[better]
+                    changed = True
+        return dist
+
+    def distancesFrom(self, cell):
+        """
+        In-block costs from cell as (array over the block, row offset,
+        col offset). Every node of a block is costed the first time any of
+        them is needed; other cells (a start) are costed on their own.
+        """
+        block = self.blockOf(*cell)
+        r0, c0, _, _ = self.blockBounds(block)
+        if cell not in self.nodes.get(block, ()):
+            return self.costBlock(block, [cell])[0], r0, c0
+        if block not in self.blockDist:
+            sources = sorted(self.nodes[block])
+            dist = self.costBlock(block, sources)
+            self.blockDist[block] = {source: dist[s] for s, source in enumerate(sources)}
+        return self.blockDist[block][cell], r0, c0
+
+    def abstractSearch(self, start, goal):
+        """A* over the abstract graph; returns the cells visited, or None"""
+        goal_block = self.blockOf(*goal)
+        lower = self.lower
+        best_g = {start: 0.0}
+        parent = {}
+        closed = set()
+        frontier = [(min_moves(*start, *goal) * lower, 0, start)]
+        order = 0
+        expanded = 0
+        while frontier:
+            _, _, cell = heapq.heappop(frontier)
+            if cell in closed:
+                continue
+            closed.add(cell)
+            expanded += 1
+            if cell == goal:
+                break
+            g = best_g[cell]
+
+            dist, r0, c0 = self.distancesFrom(cell)
+            block = self.blockOf(*cell)
+            targets = list(self.nodes.get(block, ()))
+            if block == goal_block:
+                targets.append(goal)
+            edges = [(w, float(dist[w[0] - r0, w[1] - c0])) for w in targets if w != cell]
+            edges.extend(self.links.get(cell, ()))
+
+            for w, cost in edges:
+                new_g = g + cost
+                if w not in closed and cost < math.inf and new_g < best_g.get(w, math.inf):
+                    best_g[w] = new_g
+                    parent[w] = cell
+                    order += 1
+                    heapq.heappush(frontier, (new_g + min_moves(*w, *goal) * lower, order, w))
+
+        self.stats["abstractExpanded"] = expanded
+        if goal not in closed:
+            return None
+        self.stats["abstractCost"] = best_g[goal]
+        path = [goal]
+        while path[-1] in parent:
+            path.append(parent[path[-1]])
+        return path[::-1]
+
+    def corridor(self, cells):
+        """Boolean (blockRows, blockCols) mask of the blocks to refine in"""
+        mask = np.zeros((self.blockRows, self.blockCols), dtype=bool)
+        m = self.corridorMargin
+        for cell in cells:
+            br, bc = self.blockOf(*cell)
+            mask[max(br - m, 0):br + m + 1, max(bc - m, 0):bc + m + 1] = True
+        return mask.tolist()
+
+    def refine(self, start, goal, allowed):
+        """
+        Full-resolution A* confined to the allowed blocks, reading the move
+        tables of each block as the search reaches it
+        """
+        B = self.blockSize
+        usesHeading = self.pathfinder.costModel.usesHeading
+        turn = self.pathfinder.costModel.turnTable()
+        lower = self.lower
+        gr, gc = goal
+
+        first = (start[0], start[1], NO_HEADING if usesHeading else 0)
+        best_g = {first: 0.0}
+        parent = {}
+        closed = set()
+        frontier = [(min_moves(*start, *goal) * lower, 0, 0, first)]
+        order = 0
+        expanded = 0
+        found = None
+        tables = {}
+        block = None
+        while frontier:
+            _, _, _, state = heapq.heappop(frontier)
+            if state in closed:
+                continue
+            closed.add(state)
+            expanded += 1
+            r, c, k = state
+            if (r, c) == goal:
+                found = state
+                break
+            g = best_g[state]
+            if block != (r // B, c // B):
+                block = (r // B, c // B)
+                if block not in tables:
+                    tables[block] = self.blockTables(block)
+                r0, c0, legal, edge = tables[block]
+            costs = edge[r - r0][c - c0]
+            for i in MASK_INDICES[legal[r - r0][c - c0]]:
+                nr, nc = r + HEADING_OFFSETS[i][0], c + HEADING_OFFSETS[i][1]
+                if not allowed[nr // B][nc // B]:
+                    continue
+                next_state = (nr, nc, i if usesHeading else 0)
+                new_g = g + costs[i] + (turn[k][i] if usesHeading else 0)
+                if next_state not in closed and new_g < best_g.get(next_state, math.inf):
+                    best_g[next_state] = new_g
+                    parent[next_state] = (state, i)
+                    order += 1
+                    f = new_g + min_moves(nr, nc, gr, gc) * lower
+                    heapq.heappush(frontier, (f, -new_g, order, next_state))
+
+        self.stats["refineExpanded"] = expanded
+        if found is None:
+            return None, None
+        path = []
+        state = found
+        while state in parent:
+            state, i = parent[state]
+            path.append(HEADINGS[i])
+        return path[::-1], best_g[found]
+
+    def search(self, startPos=None, finishPos=None):
+        """
+        Plan between logical positions (default: the Pathfinder's endpoints).
+        Returns the route in route.txt format, or None; counters and phase
+        timings are left in self.stats.
+        """
+        pathfinder = self.pathfinder
+        sy, sx = startPos or pathfinder.startPos
+        gy, gx = finishPos or pathfinder.endPos
+        start = (self.rows - sy, sx - 1)
+        goal = (self.rows - gy, gx - 1)
+
+        t0 = time.perf_counter()
+        blocks_before = len(self.blockDist)
+        cells = self.abstractSearch(start, goal)
+        t1 = time.perf_counter()
+        path, cost = None, None
+        if cells is not None:
+            allowed = self.corridor(cells)
+            self.stats["corridorBlocks"] = sum(map(sum, allowed))
+            path, cost = self.refine(start, goal, allowed)
+        t2 = time.perf_counter()
+
+        self.stats.update({
+            "found": path is not None,
+            "abstractNodes": len(self.links),
+            "blocksCosted": len(self.blockDist) - blocks_before,
+            "routeLength": None if path is None else len(path),
+            "routeCost": cost,
+            "time": {"abstract": t1 - t0, "refine": t2 - t1},
+        })
+        return None if path is None else headingsToRoute(path)
+
+def compareWithExact(mapData, meta, costModel="time", blockSize=16, corridorMargin=1):
+    """
+    Plan one map both hierarchically and with an exact search, and report
+    the cost gap (suboptimality, as a fraction of the exact cost) and times.
+    """
+    from ai import Pathfinder
+
+    t0 = time.perf_counter()
+    planner = HierarchicalPlanner(Pathfinder(mapData, meta, costModel), blockSize, corridorMargin)
+    t1 = time.perf_counter()
+    planner.search()
+    t2 = time.perf_counter()
+
+    # The bidirectional engine is exact and has no iteration cap
+    exact = Pathfinder(mapData, meta, costModel, engine="bidirectional", maxExpansions=None)
+    exact.search()
+    t3 = time.perf_counter()
+
+    hier_cost = planner.stats["routeCost"]
+    exact_cost = exact.stats["routeCost"]
+    gap = None
+    if hier_cost is not None and exact_cost:
+        gap = hier_cost / exact_cost - 1
+    return {
+        "hierCost": hier_cost,
+        "exactCost": exact_cost,
+        "suboptimality": gap,
+        "buildTime": t1 - t0,
+        "hierTime": t2 - t1,
+        "exactTime": t3 - t2,
+        "blocksCosted": planner.stats["blocksCosted"],
+        "refineExpanded": planner.stats.get("refineExpanded"),
+        "exactExpanded": exact.stats["nodesExpanded"],
+    }
+
+def main():
+    import argparse
+    from bench import cases
+
+    parser = argparse.ArgumentParser(description="Hierarchical planner against exact search")
+    parser.add_argument("--sizes", type=int, nargs="*", default=[100, 500],
+                        help="synthetic grid sizes (default: %(default)s)")
+    parser.add_argument("--cost", choices=["hops", "time"], default="time", help="cost model")
+    parser.add_argument("--block", type=int, default=16, help="block size in cells")
+    parser.add_argument("--margin", type=int, default=1, help="corridor margin in blocks")
+    args = parser.parse_args()
+
+    for name, load in cases(args.sizes):
+        mapData, meta = load()
+        result = compareWithExact(mapData, meta, args.cost, args.block, args.margin)
+        gap = result["suboptimality"]
+        print(f"{name:20s} hier={result['hierCost']} exact={result['exactCost']} "
+              f"gap={'n/a' if gap is None else f'{gap:.2%}'}  "
+              f"build={result['buildTime']:.3f}s hier={result['hierTime']:.3f}s "
+              f"exact={result['exactTime']:.3f}s")
+
+if __name__ == "__main__":
+    main()
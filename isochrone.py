@@ -0,0 +1,211 @@
+"""
+Isochrones: the earliest arrival cost at every cell from one start.
+
+Instead of one search per target, a wavefront is pushed out from the start
+as NumPy array operations: every sweep moves all the cells that improved
+in the last one along each of the six ALLOWED_MOVES at once, with the
+legality and move costs of the Pathfinder move tables (so the same no-go
+rule as checkValidMove, judged at the cell a move leaves from). Sweeps
+stop when nothing improves, leaving the cost of the best route to every
+cell, from which any of those routes can be read back:
+
+    field = buildIsochrones(Pathfinder(mapData, meta, "time"))
+    field.arrivalAt([1, 20])
+    field.route([1, 20])
+    field.exportContours("isochrones.json", [20, 40, 60])
+
+Costs are in the Pathfinder's cost model: moves for "hops", time for
+"time" (turn penalties included).
+"""
+import json
+import time
+
+import numpy as np
+
+from ai import HEADING_OFFSETS, HEADINGS, NO_HEADING, headingsToRoute
+
+class IsochroneField:
+    """
+    arrival[r, c, k]   cost of the best route from the start to array cell
+                       (r, c), inf if unreachable
+    lastHeading[r, c, k]  index into HEADINGS of its last move, -1 if none
+    prevSlot[r, c, k]     slot of the cell that move left from
+    k is the arriving heading index (NO_HEADING at the start) when the cost
+    model charges for turns, and always 0 otherwise.
+    """
+    def __init__(self, startPos, arrival, lastHeading, prevSlot):
+        self.startPos = list(startPos)
+        self.arrival = arrival
+        self.lastHeading = lastHeading
+        self.prevSlot = prevSlot
+        self.rows, self.cols, slots = arrival.shape
+        self.usesHeading = slots > 1
+        self.stats = {}
+
+    def arrivalGrid(self):
+        """(rows, cols) earliest arrival over all headings, [0] is the top row"""
+        return self.arrival.min(axis=2)
+
+    def arrivalAt(self, pos):
+        y, x = pos
+        return float(self.arrival[self.rows - y, x - 1].min())
+
+    def reachable(self, maxCost):
+        """Boolean (rows, cols) mask of cells reached within maxCost"""
+        return self.arrivalGrid() <= maxCost
+
+    def routeHeadings(self, pos, slot=None):
+        """
+        Headings of the best route from the start to pos, or None. slot picks
+        the arriving heading index (default: whichever is cheapest).
+        """
+        y, x = pos
+        r, c = self.rows - y, x - 1
+        if slot is None:
+            slot = int(self.arrival[r, c].argmin())
+        if np.isinf(self.arrival[r, c, slot]):
+            return None
+        path = []
+        while self.lastHeading[r, c, slot] >= 0:
+            i = int(self.lastHeading[r, c, slot])
+            path.append(HEADINGS[i])
+            slot = int(self.prevSlot[r, c, slot])
+            dr, dc = HEADING_OFFSETS[i]
+            r, c = r - dr, c - dc
+        path.reverse()
+        return path
+
+    def route(self, pos):
+        """Best route from the start to pos in the route.txt compass format"""
+        path = self.routeHeadings(pos)
+        if path is None:
+            return None
+        return headingsToRoute(path)
+
+    def contours(self, levels):
+        """
+        For each level, the logical (y, x) cells on its isochrone: reached
+        within the level, next to a cell (or the map edge) that is not.
+        """
+        grid = self.arrivalGrid()
+        result = []
+        for level in levels:
+            inside = grid <= level
+            padded = np.pad(inside, 1, constant_values=False)
+            interior = (padded[:-2, 1:-1] & padded[2:, 1:-1]
+                        & padded[1:-1, :-2] & padded[1:-1, 2:])
+            r, c = np.nonzero(inside & ~interior)
+            result.append([[self.rows - int(row), int(col) + 1] for row, col in zip(r, c)])
+        return result
+
+    def exportContours(self, path, levels):
+        """Write the contours of levels as JSON: {"startPos", "contours": [{"level", "cells"}]}"""
+        contours = [{"level": level, "cells": cells}
+                    for level, cells in zip(levels, self.contours(levels))]
+        with open(path, "w") as f:
+            json.dump({"startPos": self.startPos, "contours": contours}, f)
+
+    def save(self, path):
+        np.savez(path, startPos=self.startPos, arrival=self.arrival,
+                 lastHeading=self.lastHeading, prevSlot=self.prevSlot)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls(data["startPos"].tolist(), data["arrival"],
+                       data["lastHeading"], data["prevSlot"])
+
+def buildIsochrones(pathfinder, startPos=None, maxCost=np.inf, startHeading=None):
+    """
+    Push the wavefront out from startPos (default: the map start), for a
+    boat that arrived there with startHeading (None if it has not moved
+    yet), until no cell improves, ignoring anything dearer than maxCost.
+    Sweep counts and timing are left in the field's stats.
+    """
+    if pathfinder.times is not None:
+        raise ValueError("Isochrones need a static wind map")
+    t0 = time.perf_counter()
+    startPos = list(startPos or pathfinder.startPos)
+    rows, cols = pathfinder.rows, pathfinder.cols
+    pathfinder.buildMoveTables()
+    edge = np.asarray(pathfinder.edgeCosts, dtype=np.float64)
+
+    usesHeading = pathfinder.costModel.usesHeading
+    slots = NO_HEADING + 1 if usesHeading else 1
+    turn = np.array(pathfinder.costModel.turnTable(), dtype=np.float64)
+
+    arrival = np.full((rows, cols, slots), np.inf)
+    lastHeading = np.full((rows, cols, slots), -1, dtype=np.int8)
+    prevSlot = np.full((rows, cols, slots), -1, dtype=np.int8)
+    sr, sc = rows - startPos[0], startPos[1] - 1
+    start_slot = 0
+    if usesHeading:
+        start_slot = NO_HEADING if startHeading is None else HEADINGS.index(startHeading)
+    arrival[sr, sc, start_slot] = 0
+    improved = np.zeros((rows, cols), dtype=bool)
+    improved[sr, sc] = True
+
+    sweeps = 0
+    r, c = np.nonzero(improved)
+    while len(r):
+        sweeps += 1
+        # Cheapest way to leave each frontier cell with each heading, turn
+        # included, and the arriving slot it leaves from
+        reached = arrival[r, c]
+        if usesHeading:
+            leaving = reached[:, :, None] + turn[None, :, :]
+            from_slot = leaving.argmin(axis=1).astype(np.int8)
+            leaving = leaving.min(axis=1)
+        else:
+            leaving = np.repeat(reached, len(HEADINGS), axis=1)
+            from_slot = np.zeros(leaving.shape, dtype=np.int8)
+        leaving += edge[r, c]
+
+        # Every move out of the frontier at once, one heading at a time; a
+        # heading sends each cell to a different one, so no two collide
+        improved[:] = False
+        for i, (dr, dc) in enumerate(HEADING_OFFSETS):
+            nr, nc = r + dr, c + dc
+            cost = leaving[:, i]
+            slot = i if usesHeading else 0
+            inside = (nr >= 0) & (nr < rows) & (nc >= 0) & (nc < cols) & (cost <= maxCost)
+            better = np.flatnonzero(inside)
+            better = better[cost[better] < arrival[nr[better], nc[better], slot]]
+            if not len(better):
+                continue
+            tr, tc = nr[better], nc[better]
+            arrival[tr, tc, slot] = cost[better]
+            lastHeading[tr, tc, slot] = i
+            prevSlot[tr, tc, slot] = from_slot[better, i]
+            improved[tr, tc] = True
+        r, c = np.nonzero(improved)
+
+    field = IsochroneField(startPos, arrival, lastHeading, prevSlot)
+    field.stats = {
+        "sweeps": sweeps,
+        "reachedCells": int(np.isfinite(field.arrivalGrid()).sum()),
+        "time": time.perf_counter() - t0,
+    }
+    return field
+
+if __name__ == "__main__":
+    import argparse
+    from ai import Pathfinder, readMap
+
+    parser = argparse.ArgumentParser(description="Earliest arrival at every cell from the map start")
+    parser.add_argument("map", help="map name, e.g. map_2_Main")
+    parser.add_argument("--cost", choices=["hops", "time"], default="hops", help="cost model")
+    parser.add_argument("--start", type=int, nargs=2, metavar=("Y", "X"), help="start cell (default: map start)")
+    parser.add_argument("--levels", type=float, nargs="*", default=[], help="isochrone levels to export")
+    parser.add_argument("--contours", default="isochrones.json", help="contour output file")
+    args = parser.parse_args()
+
+    mapData, meta = readMap(args.map)
+    field = buildIsochrones(Pathfinder(mapData, meta, args.cost), args.start)
+    stats = field.stats
+    print(f"Reached {stats['reachedCells']} of {field.rows * field.cols} cells "
+          f"in {stats['sweeps']} sweeps ({stats['time']:.3f}s)")
+    print(f"Arrival at finish {meta['finishPos']}: {field.arrivalAt(meta['finishPos']):.2f}")
+    if args.levels:
+        field.exportContours(args.contours, args.levels)
+        print(f"Contours for {args.levels} saved to {args.contours}")
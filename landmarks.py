@@ -0,0 +1,204 @@
+"""
+Landmark (ALT) heuristic tables.
+
+A few landmark cells are picked on the map and the cost of the best route
+from every cell to each landmark, and from each landmark to every cell, is
+worked out once over the wind-constrained move graph (turn penalties left
+out, so the tables serve any turn table). For a finish t the triangle
+inequality then bounds the cost from any cell v to t from below:
+
+    d(v, t) >= d(v, L) - d(t, L)    and    d(v, t) >= d(L, t) - d(L, v)
+
+The best of these over all landmarks is an admissible and consistent
+heuristic, and much tighter than counting moves where the boat has to
+tack. The tables depend only on the wind field and the move costs, so they
+are built once and reused for every query:
+
+    tables = landmarkTables(Pathfinder(mapData, meta, "time"), cacheDir=".landmarks")
+    pathfinder = Pathfinder(mapData, meta, "time", landmarks=tables)
+
+Legality and costs are taken from the Pathfinder move tables, so as in
+checkValidMove a move is allowed by the wind at the cell it leaves from.
+"""
+import os
+import time
+
+import numpy as np
+
+from ai import HEADING_OFFSETS
+from readMap import mapHash
+
+LANDMARK_COUNT = 8
+
+class LandmarkTables:
+    """
+    cells[j]              logical [y, x] of landmark j
+    fromLandmark[j, r, c] cost from landmark j to array cell (r, c)
+    toLandmark[j, r, c]   cost from array cell (r, c) to landmark j
+    float32, rounded down so bounds built from them stay admissible; inf
+    where there is no route. key is landmarkKey of the Pathfinder they were
+    built for, with count the landmarks asked for (there may be fewer).
+    """
+    def __init__(self, cells, fromLandmark, toLandmark, key=None, count=None):
+        self.cells = [list(cell) for cell in cells]
+        self.fromLandmark = fromLandmark
+        self.toLandmark = toLandmark
+        self.key = key
+        self.count = len(self.cells) if count is None else count
+        _, self.rows, self.cols = fromLandmark.shape
+        self.stats = {}
+
+    def boundTo(self, finishPos):
+        """(rows, cols) float64 lower bounds on the cost of reaching finishPos"""
+        y, x = finishPos
+        r, c = self.rows - y, x - 1
+        bound = np.zeros((self.rows, self.cols))
+        for j in range(len(self.cells)):
+            for before, after in ((self.toLandmark[j], self.toLandmark[j, r, c]),
+                                  (self.fromLandmark[j, r, c], self.fromLandmark[j])):
+                # before - after, with after rounded up to undo the rounding
+                # down of the tables; an unreachable after says nothing
+                after = np.nextafter(after, np.float32(np.inf))
+                with np.errstate(invalid="ignore"):
+                    term = np.asarray(before, dtype=np.float64) - np.asarray(after, dtype=np.float64)
+                term = np.where(np.isinf(after), 0, term)
+                np.maximum(bound, term, out=bound)
+        return bound
+
+    def checkFor(self, pathfinder):
+        """Raise ValueError unless the tables were built for this wind field and cost model"""
+        if self.key is None or self.key != landmarkKey(pathfinder, self.count):
+            raise ValueError("Landmark tables were built for a different map, wind field or cost model")
+
+    def save(self, path):
+        np.savez(path, cells=np.array(self.cells), fromLandmark=self.fromLandmark,
+                 toLandmark=self.toLandmark, key=self.key or "", count=self.count)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            count = int(data["count"]) if "count" in data.files else None
+            return cls(data["cells"].tolist(), data["fromLandmark"], data["toLandmark"],
+                       str(data["key"]) or None, count)
+
+def roundDown(dist):
+    """float64 distances as float32 no larger than them"""
+    low = dist.astype(np.float32)
+    up = low > dist
+    low[up] = np.nextafter(low[up], np.float32(-np.inf))
+    return low
+
+def distances(edge, cell, reverse=False):
+    """
+    (rows, cols) cost of the best route from array cell (r, c) to every
+    cell, or from every cell to it when reverse: a label-correcting
+    wavefront over the edge costs (inf for illegal moves), one heading at a
+    time over the cells that improved in the last sweep
+    """
+    rows, cols = edge.shape[:2]
+    dist = np.full((rows, cols), np.inf)
+    dist[cell] = 0
+    improved = np.zeros((rows, cols), dtype=bool)
+    r, c = np.array([cell[0]]), np.array([cell[1]])
+    while len(r):
+        improved[:] = False
+        for i, (dr, dc) in enumerate(HEADING_OFFSETS):
+            # Forward a cell reaches its neighbour; backward it is reached
+            # from the cell a move along heading i leaves from
+            if reverse:
+                nr, nc = r - dr, c - dc
+            else:
+                nr, nc = r + dr, c + dc
+            inside = np.flatnonzero((nr >= 0) & (nr < rows) & (nc >= 0) & (nc < cols))
+            sr, sc, tr, tc = r[inside], c[inside], nr[inside], nc[inside]
+            if reverse:
+                cost = dist[sr, sc] + edge[tr, tc, i]
+            else:
+                cost = dist[sr, sc] + edge[sr, sc, i]
+            better = cost < dist[tr, tc]
+            if not better.any():
+                continue
+            tr, tc = tr[better], tc[better]
+            dist[tr, tc] = cost[better]
+            improved[tr, tc] = True
+        r, c = np.nonzero(improved)
+    return dist
+
+def buildLandmarks(pathfinder, count=LANDMARK_COUNT):
+    """
+    Pick count landmarks and build their tables. The first is the cell
+    farthest from the middle of the map, each next one the cell farthest
+    (there and back) from those picked so far, so they end up spread over
+    the edges of the reachable area.
+    """
+    if pathfinder.times is not None:
+        raise ValueError("Landmarks need a static wind map")
+    t0 = time.perf_counter()
+    rows, cols = pathfinder.rows, pathfinder.cols
+    pathfinder.buildMoveTables()
+    edge = np.asarray(pathfinder.edgeCosts, dtype=np.float64)
+
+    middle = (rows // 2, cols // 2)
+    spread = distances(edge, middle) + distances(edge, middle, reverse=True)
+    cells, from_tables, to_tables = [], [], []
+    while len(cells) < count:
+        finite = np.isfinite(spread)
+        if not finite.any():
+            break
+        r, c = np.unravel_index(np.where(finite, spread, -1).argmax(), spread.shape)
+        if cells and spread[r, c] == 0:
+            break  # every reachable cell is a landmark already
+        from_dist = distances(edge, (r, c))
+        to_dist = distances(edge, (r, c), reverse=True)
+        cells.append([rows - int(r), int(c) + 1])
+        from_tables.append(roundDown(from_dist))
+        to_tables.append(roundDown(to_dist))
+        around = from_dist + to_dist
+        spread = around if len(cells) == 1 else np.minimum(spread, around)
+
+    tables = LandmarkTables(cells, np.array(from_tables), np.array(to_tables),
+                            landmarkKey(pathfinder, count), count)
+    tables.stats = {"landmarks": len(cells), "time": time.perf_counter() - t0,
+                    "bytes": tables.fromLandmark.nbytes + tables.toLandmark.nbytes}
+    return tables
+
+def landmarkKey(pathfinder, count):
+    """Hash of the wind grids and the cost parameters the tables depend on"""
+    # Turn penalties are left out of the tables, and so out of the key
+    return mapHash(pathfinder.mapData, pathfinder.costModel.key()[:4], count)
+
+def landmarkTables(pathfinder, count=LANDMARK_COUNT, cacheDir=None):
+    """buildLandmarks, cached on disk in cacheDir (if given) per wind field and cost model"""
+    if cacheDir is None:
+        return buildLandmarks(pathfinder, count)
+    key = landmarkKey(pathfinder, count)
+    path = os.path.join(cacheDir, f"landmarks_{key}.npz")
+    if os.path.exists(path):
+        return LandmarkTables.load(path)
+    tables = buildLandmarks(pathfinder, count)
+    os.makedirs(cacheDir, exist_ok=True)
+    tables.save(path)
+    return tables
+
+if __name__ == "__main__":
+    import argparse
+    from ai import Pathfinder, readMap
+
+    parser = argparse.ArgumentParser(description="Compare A* with and without landmark tables")
+    parser.add_argument("map", help="map name, e.g. map_2_Main")
+    parser.add_argument("--cost", choices=["hops", "time"], default="time", help="cost model")
+    parser.add_argument("--count", type=int, default=LANDMARK_COUNT, help="landmarks to pick")
+    parser.add_argument("--cache", default=None, help="directory to cache the tables in")
+    args = parser.parse_args()
+
+    mapData, meta = readMap(args.map)
+    tables = landmarkTables(Pathfinder(mapData, meta, args.cost), args.count, args.cache)
+    if tables.stats:
+        print(f"{tables.stats['landmarks']} landmarks in {tables.stats['time']:.3f}s "
+              f"({tables.stats['bytes'] / 1024:.0f} KiB): {tables.cells}")
+    for landmarks in (None, tables):
+        pathfinder = Pathfinder(mapData, meta, args.cost, landmarks=landmarks, maxExpansions=None)
+        pathfinder.search()
+        stats = pathfinder.stats
+        print(f"{'ALT' if landmarks else 'default'} heuristic: {stats['nodesExpanded']} nodes, "
+              f"cost {stats['routeCost']}, {stats['time']['search']:.3f}s")
@@ -0,0 +1,90 @@
+"""
+Load-test client for server.py: opens a number of connections, each
+sending requests one after another, and reports throughput and latency.
+
+    python loadtest.py --unix /tmp/planner.sock --map map_2_Main --requests 2000 --concurrency 16
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+def percentile(values, q):
+    """q-th percentile (0-100) by nearest rank"""
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, -(-len(values) * q // 100) - 1))]
+
+def makeRequests(mapName, count, cost, engine, randomStarts, seed=0):
+    """Requests for the map's own endpoints, or from random starts"""
+    with open(f"{mapName}_meta.json") as f:
+        meta = json.load(f)
+    rng = random.Random(seed)
+    requests = []
+    for i in range(count):
+        request = {"id": i, "map": mapName, "cost": cost, "engine": engine}
+        if randomStarts:
+            request["start"] = [rng.randint(1, meta["rows"]), rng.randint(1, meta["cols"])]
+        requests.append(request)
+    return requests
+
+async def connect(unix, host, port):
+    if unix:
+        return await asyncio.open_unix_connection(unix)
+    return await asyncio.open_connection(host, port)
+
+async def client(requests, unix, host, port, latencies, errors):
+    reader, writer = await connect(unix, host, port)
+    try:
+        for request in requests:
+            t0 = time.perf_counter()
+            writer.write(json.dumps(request).encode("utf-8") + b"\n")
+            await writer.drain()
+            reply = json.loads(await reader.readline())
+            latencies.append(time.perf_counter() - t0)
+            if "error" in reply:
+                errors.append(reply["error"])
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+async def run(requests, concurrency, unix=None, host="127.0.0.1", port=8765):
+    latencies, errors = [], []
+    share = [requests[i::concurrency] for i in range(concurrency)]
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client(part, unix, host, port, latencies, errors)
+                           for part in share if part))
+    elapsed = time.perf_counter() - t0
+    return {
+        "requests": len(latencies),
+        "errors": len(errors),
+        "elapsed": elapsed,
+        "requestsPerSecond": len(latencies) / elapsed if elapsed else None,
+        "p50": percentile(latencies, 50),
+        "p99": percentile(latencies, 99),
+        "max": max(latencies, default=None),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test the planning server")
+    parser.add_argument("--unix", help="Unix socket path (default: TCP)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--map", default="map_2_Main", help="map name (its _meta.json must be readable here)")
+    parser.add_argument("--requests", type=int, default=1000, help="total requests")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel connections")
+    parser.add_argument("--cost", choices=["hops", "time"], default="hops", help="cost model")
+    parser.add_argument("--engine", default="astar", help="search engine")
+    parser.add_argument("--random-starts", action="store_true", help="random start cells instead of the map start")
+    args = parser.parse_args()
+
+    requests = makeRequests(args.map, args.requests, args.cost, args.engine, args.random_starts)
+    result = asyncio.run(run(requests, args.concurrency, args.unix, args.host, args.port))
+    print(f"{result['requests']} requests ({result['errors']} errors) in {result['elapsed']:.2f}s: "
+          f"{result['requestsPerSecond']:.1f} req/s, p50 {result['p50'] * 1000:.1f}ms, "
+          f"p99 {result['p99'] * 1000:.1f}ms, max {result['max'] * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,185 @@
+"""
+Profile the solve pipeline: where the time goes, per phase and per function.
+
+Each map is solved as ai.main does (load, set up the Pathfinder, search,
+validate the route) with every phase under its own cProfile profiler, so
+each function's calls and time are attributed to the phase that made them.
+The route cache and console output are left out, as they would hide the
+search and the validation behind a cache hit or terminal I/O.
+
+    python ai.py --profile map_1_Training map_2_Main --sizes 500 2000
+
+prints a summary per map and writes
+    profile_report.json   phases and functions per map, plus search stats
+    profile_stacks.txt    collapsed stacks ("map;phase;f;g 1234", in
+                          microseconds) for flamegraph.pl or speedscope
+
+cProfile records callers, not whole stacks, so each function's time is
+split across the stacks reaching it in proportion to the time each caller
+spends in it.
+"""
+import cProfile
+import json
+import os
+import pstats
+import time
+
+from ai import Pathfinder, readMap, validate_route
+
+PHASES = ("load", "setup", "search", "validate")
+REPORT_FILE = "profile_report.json"
+STACKS_FILE = "profile_stacks.txt"
+# Functions listed per map in the summary, and the shortest stack kept
+TOP_FUNCTIONS = 15
+MIN_STACK_TIME = 1e-6
+MAX_STACK_DEPTH = 64
+
+def functionName(func):
+    """module.function for a pstats (file, line, name) key"""
+    filename, _, name = func
+    if filename == "~":  # built-ins
+        return name
+    module = os.path.splitext(os.path.basename(filename))[0]
+    return f"{module}.{name}"
+
+def profilePhases(load, costModel="hops", engine="astar"):
+    """
+    Run one solve with a profiler per phase. load() returns (mapData, meta).
+    Returns ({phase: pstats.Stats}, {phase: wall time}, meta, Pathfinder.stats).
+    """
+    profiles = {phase: cProfile.Profile() for phase in PHASES}
+    walls = {}
+
+    def step(phase, action):
+        t0 = time.perf_counter()
+        profiles[phase].enable()
+        try:
+            return action()
+        finally:
+            profiles[phase].disable()
+            walls[phase] = time.perf_counter() - t0
+
+    mapData, meta = step("load", load)
+    # No expansion cap, so large maps are profiled solving rather than giving up
+    pathfinder = step("setup", lambda: Pathfinder(mapData, meta, costModel, engine=engine,
+                                                  maxExpansions=None))
+    route = step("search", pathfinder.search)
+    if route is not None:
+        step("validate", lambda: validate_route(mapData, meta, route=route, verbose=False))
+    else:
+        walls["validate"] = 0.0
+
+    stats = {}
+    for phase, profile in profiles.items():
+        # pstats refuses a profiler that recorded nothing
+        if profile.getstats():
+            stats[phase] = pstats.Stats(profile)
+    return stats, walls, meta, pathfinder.stats
+
+def functionRows(stats):
+    """Per-function rows of one phase's pstats, dearest self time first"""
+    rows = []
+    for func, (cc, nc, tt, ct, _) in stats.stats.items():
+        rows.append({
+            "function": functionName(func),
+            "file": func[0],
+            "line": func[1],
+            "calls": nc,
+            "primitiveCalls": cc,
+            "selfTime": tt,
+            "totalTime": ct,
+        })
+    rows.sort(key=lambda row: row["selfTime"], reverse=True)
+    return rows
+
+def collapsedStacks(stats, prefix):
+    """
+    {"prefix;f;g": self seconds} from one phase's caller graph: a function's
+    time on a stack is its own share of its cumulative time, and passes the
+    same share on to each function it calls
+    """
+    calls = {}
+    for func, (_, _, _, _, callers) in stats.stats.items():
+        for caller, (_, _, _, ct) in callers.items():
+            calls.setdefault(caller, []).append((func, ct))
+    roots = [func for func, entry in stats.stats.items() if not entry[4]]
+    stacks = {}
+
+    def walk(func, stack, time_here):
+        _, _, tt, ct, _ = stats.stats[func]
+        share = time_here / ct if ct > 0 else 0.0
+        key = f"{stack};{functionName(func)}"
+        stacks[key] = stacks.get(key, 0.0) + tt * share
+        if key.count(";") >= MAX_STACK_DEPTH:
+            return
+        for callee, edge_time in calls.get(func, ()):
+            callee_time = edge_time * share
+            if callee_time >= MIN_STACK_TIME and f";{functionName(callee)};" not in key + ";":
+                walk(callee, key, callee_time)
+
+    for func in roots:
+        walk(func, prefix, stats.stats[func][3])
+    return stacks
+
+def profileMaps(cases, costModel="hops", engine="astar", top=TOP_FUNCTIONS,
+                reportFile=REPORT_FILE, stacksFile=STACKS_FILE, log=print):
+    """
+    Profile each (name, load) case; print a summary, write the JSON report
+    and the collapsed stacks. Returns the report.
+    """
+    report = {"costModel": costModel, "engine": engine,
+              "date": time.strftime("%Y-%m-%d %H:%M:%S"), "maps": []}
+    stacks = {}
+    for name, load in cases:
+        stats, walls, meta, search_stats = profilePhases(load, costModel, engine)
+        phases = {}
+        functions = []
+        for phase in PHASES:
+            rows = functionRows(stats[phase]) if phase in stats else []
+            phases[phase] = {
+                "wallTime": walls[phase],
+                "profiledTime": stats[phase].total_tt if phase in stats else 0.0,
+                "calls": sum(row["calls"] for row in rows),
+            }
+            functions += [{"phase": phase, **row} for row in rows]
+            if phase in stats:
+                stacks.update(collapsedStacks(stats[phase], f"{name};{phase}"))
+        functions.sort(key=lambda row: row["selfTime"], reverse=True)
+        report["maps"].append({
+            "map": name,
+            "rows": meta["rows"],
+            "cols": meta["cols"],
+            "phases": phases,
+            "functions": functions,
+            "search": search_stats,
+        })
+
+        log(f"\n{name} ({meta['rows']}x{meta['cols']}, {costModel}): "
+            f"{search_stats['nodesExpanded']} nodes, route cost {search_stats['routeCost']}"
+            f"{' (out of budget)' if search_stats.get('outOfBudget') else ''}")
+        log(f"  {'phase':<10} {'wall':>9} {'profiled':>9} {'calls':>10}")
+        for phase, entry in phases.items():
+            log(f"  {phase:<10} {entry['wallTime']:>8.3f}s {entry['profiledTime']:>8.3f}s {entry['calls']:>10}")
+        log(f"  {'function':<40} {'phase':<9} {'calls':>9} {'self':>9} {'total':>9}")
+        for row in functions[:top]:
+            log(f"  {row['function'][:40]:<40} {row['phase']:<9} {row['calls']:>9} "
+                f"{row['selfTime']:>8.3f}s {row['totalTime']:>8.3f}s")
+
+    with open(reportFile, "w") as f:
+        json.dump(report, f, indent=2, default=str)
+    with open(stacksFile, "w") as f:
+        for stack, seconds in stacks.items():
+            micros = round(seconds * 1e6)
+            if micros > 0:
+                f.write(f"{stack} {micros}\n")
+    log(f"\nReport saved to {reportFile}, collapsed stacks to {stacksFile}")
+    return report
+
+def cases(mapNames, sizes=()):
+    """(name, load) pairs for shipped maps and synthetic size x size grids"""
+    for name in mapNames:
+        yield name, lambda name=name: readMap(name)
+    if sizes:
+        from bench import makeSyntheticMap
+        for size in sizes:
+            yield f"synthetic_{size}", lambda size=size: makeSyntheticMap(size, size)
@@ -0,0 +1,444 @@
+import hashlib
+import json
+import struct
+import zlib
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Binary map container (.bmap):
+#   8 bytes   magic
+#   4 bytes   little-endian uint32 header length
+#   header    UTF-8 JSON: name, meta, and for each array its dtype, shape, offset
+#   arrays    contiguous, each starting on an ARRAY_ALIGN byte boundary
+# Arrays are in the same layout as the JSON maps ([0] is the top row).
+# Time-varying maps store (T, rows, cols) stacks of wind frames plus a
+# "times" list in the header with the timestamp of each frame.
+MAGIC = b"WINDMAP1"
+ARRAY_ALIGN = 64
+BINARY_EXT = ".bmap"
+
+# The wind CSVs are parsed this many bytes of lines at a time
+CSV_CHUNK_BYTES = 1 << 22
+
+# Tiled map container (.wtiles), for grids too big to hold in memory:
+#   8 bytes   magic
+#   4 bytes   little-endian uint32 header length
+#   header    UTF-8 JSON: name, meta, tileSize, windSpeedMax, indexOffset
+#   index     uint64 (offset, length) per tile per array, tiles row-major,
+#             windDir then windSpeed
+#   tiles     zlib-compressed float32 tiles ([0] is the top row); tiles on
+#             the bottom and right edges are cut to the map
+TILED_MAGIC = b"WINDTIL1"
+TILED_EXT = ".wtiles"
+TILE_SIZE = 256
+TILED_KEYS = ("windDir", "windSpeed")
+
+# Grids without a stored content hash are hashed this many bytes at a time
+HASH_CHUNK_BYTES = 1 << 24
+
+def readJsonMap(mapFilename):
+    with open(mapFilename + ".json") as f:
+        mapData = json.load(f)
+    with open(mapFilename + "_meta.json") as f:
+        meta = json.load(f)
+    return mapData, meta
+
+def readCsvGrid(path, rows, cols, dtype=np.float64):
+    """
+    Parse one wind CSV into a preallocated (rows, cols) array, a chunk of
+    lines at a time, so memory stays at the grid plus one chunk of text.
+    Raises ValueError if the grid is not rows x cols.
+    """
+    grid = np.empty((rows, cols), dtype=dtype)
+    row = 0
+    with open(path) as f:
+        while True:
+            lines = f.readlines(CSV_CHUNK_BYTES)
+            if not lines:
+                break
+            lines = [line for line in lines if not line.isspace()]
+            if not lines:
+                continue
+            try:
+                chunk = np.loadtxt(lines, delimiter=",", dtype=dtype, ndmin=2)
+            except ValueError as e:
+                raise ValueError(f"{path}: {e}") from e
+            if chunk.shape[1] != cols:
+                raise ValueError(f"{path}: rows from {row + 1} have {chunk.shape[1]} values, expected {cols}")
+            if row + len(chunk) > rows:
+                raise ValueError(f"{path}: more than the {rows} rows in the map meta")
+            grid[row:row + len(chunk)] = chunk
+            row += len(chunk)
+    if row != rows:
+        raise ValueError(f"{path}: {row} rows, expected {rows}")
+    return grid
+
+def readCsvMap(mapFilename, parallel=True):
+    """
+    Read the _windDir.csv / _windSpeed.csv pair shipped beside a map into
+    float64 arrays, checked against the rows/cols in its _meta.json. With
+    parallel the two files are parsed in their own threads.
+    """
+    with open(mapFilename + "_meta.json") as f:
+        meta = json.load(f)
+    mapData = {"name": meta.get("name", mapFilename)}
+    keys = ("windDir", "windSpeed")
+    paths = [f"{mapFilename}_{key}.csv" for key in keys]
+    shape = (meta["rows"], meta["cols"])
+    if parallel:
+        with ThreadPoolExecutor(len(paths)) as pool:
+            grids = list(pool.map(lambda path: readCsvGrid(path, *shape), paths))
+    else:
+        grids = [readCsvGrid(path, *shape) for path in paths]
+    mapData.update(zip(keys, grids))
+    return mapData, meta
+
+def directionDtype(windDir):
+    """Whole-degree directions fit in int16, anything else stays float32"""
+    if np.all(windDir == np.round(windDir)) and np.all(np.abs(windDir) < 2**15):
+        return np.dtype("<i2")
+    return np.dtype("<f4")
+
+def writeBinaryMap(path, mapData, meta):
+    windDir = np.asarray(mapData["windDir"], dtype=np.float64)
+    windSpeed = np.asarray(mapData["windSpeed"], dtype=np.float64)
+    shape = (meta["rows"], meta["cols"])
+    if windDir.shape != shape or windSpeed.shape != shape:
+        raise ValueError(f"Wind grids {windDir.shape}/{windSpeed.shape} do not match meta {shape}")
+
+    arrays = {
+        "windDir": windDir.astype(directionDtype(windDir)),
+        "windSpeed": windSpeed.astype("<f4"),
+    }
+    hashes = []
+    for key, arr in arrays.items():
+        hashes.append(gridHasher(key, arr.dtype, arr.shape))
+        hashes[-1].update(arr.tobytes())
+
+    # Offsets depend on the header length, so lay out with a placeholder first
+    header = {
+        "name": mapData.get("name", meta.get("name")),
+        "meta": meta,
+        "windSpeedMax": float(windSpeed.max()),
+        "contentHash": combineHashes(hashes),
+        "arrays": {},
+    }
+    offset = 0
+    for _ in range(2):
+        header_bytes = json.dumps(header).encode("utf-8")
+        offset = align(len(MAGIC) + 4 + len(header_bytes))
+        for key, arr in arrays.items():
+            header["arrays"][key] = {"dtype": arr.dtype.str, "shape": list(arr.shape), "offset": offset}
+            offset = align(offset + arr.nbytes)
+    header_bytes = json.dumps(header).encode("utf-8")
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<I", len(header_bytes)))
+        f.write(header_bytes)
+        for key, arr in arrays.items():
+            f.write(b"\0" * (header["arrays"][key]["offset"] - f.tell()))
+            f.write(arr.tobytes())
+
+def gridHasher(key, dtype, shape):
+    """sha256 for the stored bytes of one grid, seeded with how they are laid out"""
+    return hashlib.sha256(f"{key}:{np.dtype(dtype).str}:{list(shape)}".encode("utf-8"))
+
+def combineHashes(hashes):
+    """
+    The contentHash written into .bmap and .wtiles headers, so mapHash can
+    key caches on it without reading the grids back
+    """
+    return hashlib.sha256(b"".join(h.digest() for h in hashes)).hexdigest()[:20]
+
+def align(offset):
+    return -(-offset // ARRAY_ALIGN) * ARRAY_ALIGN
+
+def readBinaryHeader(path):
+    with open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a binary map file")
+        (length,) = struct.unpack("<I", f.read(4))
+        return json.loads(f.read(length).decode("utf-8"))
+
+def writeFrameStack(path, meta, times, frames):
+    """
+    Write a time-varying map: frames is an iterable of (windDir, windSpeed)
+    grids, one per timestamp in times, written one frame at a time so the
+    whole forecast never has to be in memory. Both stacks are float32.
+    """
+    times = [float(t) for t in times]
+    if any(b <= a for a, b in zip(times, times[1:])):
+        raise ValueError("Frame times must be strictly increasing")
+    shape = (len(times), meta["rows"], meta["cols"])
+    frame_bytes = meta["rows"] * meta["cols"] * 4
+
+    header = {"name": meta.get("name"), "meta": meta, "times": times,
+              "windSpeedMax": 0.0, "contentHash": "0" * 20, "arrays": {}}
+    offset = align(len(MAGIC) + 4 + len(json.dumps(header)) + 2 * 100)
+    for key in ("windDir", "windSpeed"):
+        header["arrays"][key] = {"dtype": "<f4", "shape": list(shape), "offset": offset}
+        offset = align(offset + shape[0] * frame_bytes)
+    # windSpeedMax is only known at the end, so reserve room for the header
+    reserved = header["arrays"]["windDir"]["offset"] - len(MAGIC) - 4
+    hashes = {key: gridHasher(key, "<f4", shape) for key in ("windDir", "windSpeed")}
+
+    speed_max = 0.0
+    count = 0
+    with open(path, "wb") as f:
+        f.truncate(offset)
+        for i, (windDir, windSpeed) in enumerate(frames):
+            if i >= shape[0]:
+                raise ValueError(f"More frames than the {shape[0]} times given")
+            for key, grid in (("windDir", windDir), ("windSpeed", windSpeed)):
+                grid = np.asarray(grid, dtype="<f4")
+                if grid.shape != shape[1:]:
+                    raise ValueError(f"Frame {i} {key} is {grid.shape}, expected {shape[1:]}")
+                f.seek(header["arrays"][key]["offset"] + i * frame_bytes)
+                data = grid.tobytes()
+                hashes[key].update(data)
+                f.write(data)
+            speed_max = max(speed_max, float(np.max(windSpeed)))
+            count += 1
+        if count != shape[0]:
+            raise ValueError(f"Got {count} frames for {shape[0]} times")
+
+        header["windSpeedMax"] = speed_max
+        header["contentHash"] = combineHashes(hashes.values())
+        header_bytes = json.dumps(header).encode("utf-8").ljust(reserved)
+        f.seek(0)
+        f.write(MAGIC)
+        f.write(struct.pack("<I", reserved))
+        f.write(header_bytes)
+
+def readBinaryMap(path):
+    """
+    Open a .bmap file. windDir and windSpeed are read-only np.memmap arrays,
+    so only the pages (and, for time-varying maps, the frames) the search
+    actually touches are read from disk.
+    """
+    header = readBinaryHeader(path)
+    mapData = {"name": header["name"], "windSpeedMax": header["windSpeedMax"]}
+    if "times" in header:
+        mapData["times"] = header["times"]
+    if "contentHash" in header:
+        mapData["contentHash"] = header["contentHash"]
+    for key, info in header["arrays"].items():
+        mapData[key] = np.memmap(path, dtype=np.dtype(info["dtype"]), mode="r",
+                                 offset=info["offset"], shape=tuple(info["shape"]))
+    return mapData, header["meta"]
+
+def writeTiledMap(path, mapData, meta, tileSize=TILE_SIZE, level=1):
+    """
+    Write a static map as independently compressed tiles. The grids are
+    read one tile at a time, so a memory-mapped source (readBinaryMap)
+    never has to fit in memory either.
+    """
+    rows, cols = meta["rows"], meta["cols"]
+    grids = [mapData[key] for key in TILED_KEYS]
+    for key, grid in zip(TILED_KEYS, grids):
+        if tuple(np.shape(grid)) != (rows, cols):
+            raise ValueError(f"{key} is {np.shape(grid)}, expected {(rows, cols)}")
+    tile_rows, tile_cols = -(-rows // tileSize), -(-cols // tileSize)
+    index = np.zeros((tile_rows, tile_cols, len(TILED_KEYS), 2), dtype="<u8")
+
+    header = {"name": mapData.get("name", meta.get("name")), "meta": meta,
+              "tileSize": tileSize, "windSpeedMax": 0.0, "contentHash": "0" * 20, "indexOffset": 0}
+    # windSpeedMax is only known at the end, so reserve room for the header
+    reserved = len(json.dumps(header)) + 100
+    header["indexOffset"] = align(len(TILED_MAGIC) + 4 + reserved)
+
+    # Tiles are hashed in the order they are written, not row-major
+    hashes = [gridHasher(f"{key}@{tileSize}", "<f4", (rows, cols)) for key in TILED_KEYS]
+    speed_max = 0.0
+    with open(path, "wb") as f:
+        f.seek(header["indexOffset"] + index.nbytes)
+        for tr in range(tile_rows):
+            # A view of a memory-mapped source; only the tiles get copied
+            bands = [np.asarray(grid[tr * tileSize:(tr + 1) * tileSize]) for grid in grids]
+            for tc in range(tile_cols):
+                c0 = tc * tileSize
+                for k, band in enumerate(bands):
+                    tile = np.ascontiguousarray(band[:, c0:c0 + tileSize], dtype="<f4")
+                    if k == 1:
+                        speed_max = max(speed_max, float(tile.max()))
+                    hashes[k].update(tile.tobytes())
+                    data = zlib.compress(tile.tobytes(), level)
+                    index[tr, tc, k] = (f.tell(), len(data))
+                    f.write(data)
+
+        header["windSpeedMax"] = speed_max
+        header["contentHash"] = combineHashes(hashes)
+        f.seek(0)
+        f.write(TILED_MAGIC)
+        f.write(struct.pack("<I", reserved))
+        f.write(json.dumps(header).encode("utf-8").ljust(reserved))
+        f.seek(header["indexOffset"])
+        f.write(index.tobytes())
+
+class TileStore:
+    """
+    Tiles of a .wtiles file, decompressed on demand and kept in an LRU of
+    maxTiles tiles (shared by both grids). counters has the tile hits,
+    misses and evictions so far.
+    """
+    def __init__(self, path, maxTiles=64):
+        with open(path, "rb") as f:
+            if f.read(len(TILED_MAGIC)) != TILED_MAGIC:
+                raise ValueError(f"{path} is not a tiled map file")
+            (length,) = struct.unpack("<I", f.read(4))
+            self.header = json.loads(f.read(length).decode("utf-8"))
+        meta = self.header["meta"]
+        self.rows, self.cols = meta["rows"], meta["cols"]
+        self.tileSize = self.header["tileSize"]
+        shape = (-(-self.rows // self.tileSize), -(-self.cols // self.tileSize), len(TILED_KEYS), 2)
+        self.index = np.memmap(path, dtype="<u8", mode="r", offset=self.header["indexOffset"], shape=shape)
+        self.path = path
+        self.file = open(path, "rb")
+        self.maxTiles = maxTiles
+        self.cache = OrderedDict()
+        self.counters = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def tile(self, key, tr, tc):
+        """Tile (tr, tc) of grid key as a read-only float32 array"""
+        cache_key = (key, tr, tc)
+        tile = self.cache.get(cache_key)
+        if tile is not None:
+            self.cache.move_to_end(cache_key)
+            self.counters["hits"] += 1
+            return tile
+
+        self.counters["misses"] += 1
+        offset, length = self.index[tr, tc, TILED_KEYS.index(key)]
+        self.file.seek(int(offset))
+        r0, c0 = tr * self.tileSize, tc * self.tileSize
+        shape = (min(self.tileSize, self.rows - r0), min(self.tileSize, self.cols - c0))
+        tile = np.frombuffer(zlib.decompress(self.file.read(int(length))), dtype="<f4").reshape(shape)
+        self.cache[cache_key] = tile
+        while len(self.cache) > self.maxTiles:
+            self.cache.popitem(last=False)
+            self.counters["evictions"] += 1
+        return tile
+
+    def close(self):
+        self.file.close()
+
+class TiledGrid:
+    """
+    Read-only (rows, cols) view of one grid of a TileStore. Supports
+    grid[r, c] and grid[r][c] for single cells and grid[r0:r1, c0:c1] for
+    blocks; np.asarray(grid) reads the whole grid.
+    """
+    def __init__(self, store, key):
+        self.store = store
+        self.key = key
+        self.shape = (store.rows, store.cols)
+        self.dtype = np.dtype("<f4")
+
+    def __getitem__(self, index):
+        if not isinstance(index, tuple):
+            return TiledRow(self, index)
+        r, c = index
+        if isinstance(r, slice) or isinstance(c, slice):
+            return self.block(r, c)
+        size = self.store.tileSize
+        return self.store.tile(self.key, r // size, c // size)[r % size, c % size]
+
+    def block(self, rows, cols):
+        r0, r1, _ = (rows if isinstance(rows, slice) else slice(rows, rows + 1)).indices(self.shape[0])
+        c0, c1, _ = (cols if isinstance(cols, slice) else slice(cols, cols + 1)).indices(self.shape[1])
+        out = np.empty((max(r1 - r0, 0), max(c1 - c0, 0)), dtype=self.dtype)
+        size = self.store.tileSize
+        for tr in range(r0 // size, -(-r1 // size)):
+            for tc in range(c0 // size, -(-c1 // size)):
+                tile = self.store.tile(self.key, tr, tc)
+                tr0, tc0 = tr * size, tc * size
+                a0, a1 = max(r0, tr0), min(r1, tr0 + size)
+                b0, b1 = max(c0, tc0), min(c1, tc0 + size)
+                out[a0 - r0:a1 - r0, b0 - c0:b1 - c0] = tile[a0 - tr0:a1 - tr0, b0 - tc0:b1 - tc0]
+        return out
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __array__(self, dtype=None, copy=None):
+        grid = self.block(slice(None), slice(None))
+        return grid if dtype is None else grid.astype(dtype)
+
+class TiledRow:
+    def __init__(self, grid, r):
+        self.grid = grid
+        self.r = r
+
+    def __getitem__(self, c):
+        return self.grid[self.r, c]
+
+def readTiledMap(path, maxTiles=64):
+    """
+    Open a .wtiles file. windDir and windSpeed are TiledGrid views and
+    "tiles" the TileStore behind them, so only the tiles a search reaches
+    are read, and at most maxTiles are held at once.
+    """
+    store = TileStore(path, maxTiles)
+    header = store.header
+    mapData = {"name": header["name"], "windSpeedMax": header["windSpeedMax"], "tiles": store,
+               "contentHash": header["contentHash"]}
+    for key in TILED_KEYS:
+        mapData[key] = TiledGrid(store, key)
+    return mapData, header["meta"]
+
+def mapHash(mapData, *extra):
+    """
+    Short content hash of a map's wind grids plus any extra JSON-able values
+    (meta, endpoints, cost parameters), for keying on-disk caches. Maps read
+    from .bmap and .wtiles files carry the hash of their grids in the
+    header, so the grids are not read at all; other arrays are hashed as
+    stored, a chunk of rows at a time, and nested lists as float64.
+    """
+    h = hashlib.sha256()
+    if mapData.get("contentHash") is not None:
+        h.update(mapData["contentHash"].encode("utf-8"))
+    else:
+        for key in ("windDir", "windSpeed"):
+            grid = mapData[key]
+            if isinstance(grid, TiledGrid):
+                # A file from before contentHash: the whole grid, a band at a time
+                step = grid.store.tileSize
+                chunks = (grid[r0:r0 + step, :] for r0 in range(0, grid.shape[0], step))
+            else:
+                if not isinstance(grid, np.ndarray):
+                    grid = np.asarray(grid, dtype=np.float64)
+                step = max(1, HASH_CHUNK_BYTES // max(1, grid[:1].nbytes))
+                chunks = (grid[i:i + step] for i in range(0, len(grid), step))
+            h.update(repr(tuple(grid.shape)).encode("utf-8"))
+            for chunk in chunks:
+                h.update(np.ascontiguousarray(chunk).tobytes())
+    h.update(json.dumps(extra, sort_keys=True, default=list).encode("utf-8"))
+    return h.hexdigest()[:20]
+
+def convertMap(mapFilename, source="json", tiled=False):
+    """
+    Convert a shipped map (source "json" for <map>.json, "csv" for the
+    _windDir.csv/_windSpeed.csv pair) into <map>.bmap, or <map>.wtiles
+    when tiled. Returns the new path.
+    """
+    if source == "json":
+        mapData, meta = readJsonMap(mapFilename)
+    elif source == "csv":
+        mapData, meta = readCsvMap(mapFilename)
+    else:
+        raise ValueError(f"Unknown map source: {source}")
+    if tiled:
+        path = mapFilename + TILED_EXT
+        writeTiledMap(path, mapData, meta)
+    else:
+        path = mapFilename + BINARY_EXT
+        writeBinaryMap(path, mapData, meta)
+    return path
+
+if __name__ == "__main__":
+    import sys
+    for name in sys.argv[1:] or ["map_1_Training", "map_2_Main", "map_3_Tiebreaker"]:
+        print(f"{name} -> {convertMap(name)}")
@@ -0,0 +1,238 @@
+"""
+Incremental replanning with D* Lite.
+
+IncrementalPlanner keeps its search state between calls. It searches
+backwards from the finish (g is the cost to the finish, as in costToGo),
+so when the boat moves on only the stretch near the boat needs work, and
+when update_wind patches a few cells only the states whose moves changed
+are repaired:
+
+    planner = IncrementalPlanner(mapData, meta, "time")
+    route = planner.plan()
+    planner.update_wind([(12, 7), (12, 8)], 215, 4.2)
+    route = planner.plan([20, 5], heading=60)
+
+States are (array row, array col, slot) as in engines.py: slot is the
+arriving heading index when the cost model charges for turns, else 0.
+"""
+import heapq
+import math
+import time
+
+import numpy as np
+
+from ai import (HEADING_OFFSETS, HEADINGS, MASK_INDICES, NO_HEADING, TABLE_BAND_ROWS,
+                Pathfinder, headingsToRoute, min_moves)
+
+class IncrementalPlanner:
+    def __init__(self, mapData, meta, costModel=None):
+        # Own writable copies of the wind, so updates never touch the caller's map
+        mapData = dict(mapData)
+        mapData.pop("contentHash", None)  # the copies get patched below
+        for key in ("windDir", "windSpeed"):
+            mapData[key] = np.array(mapData[key], dtype=np.float64)
+        self.pathfinder = Pathfinder(mapData, meta, costModel)
+        if self.pathfinder.times is not None:
+            raise ValueError("Incremental replanning needs a static wind map")
+        self.mapData = mapData
+        self.rows, self.cols = meta["rows"], meta["cols"]
+        self.usesHeading = self.pathfinder.costModel.usesHeading
+        self.turn = self.pathfinder.costModel.turnTable()
+
+        pathfinder = self.pathfinder
+        # The Pathfinder's own move tables, indexed in place; update_wind
+        # rebuilds them where the wind changes
+        pathfinder.buildMoveTables()
+        self.legal = pathfinder.legalMoves
+        self.edge = pathfinder.edgeCosts
+        self.stats = {}
+        self.reset(pathfinder.endPos)
+
+    def reset(self, finishPos):
+        """Forget all search state and plan towards finishPos from scratch"""
+        self.finishPos = list(finishPos)
+        self.goal = (self.rows - finishPos[0], finishPos[1] - 1)
+        self.lower = self.pathfinder.minMoveCost
+        self.g = {}
+        self.rhs = {}
+        self.queue = []     # heap of (key, state), stale entries skipped
+        self.queued = {}    # state -> its current key
+        self.km = 0.0
+        self.start = None
+        self.last = None
+        for k in (range(NO_HEADING + 1) if self.usesHeading else [0]):
+            state = self.goal + (k,)
+            self.rhs[state] = 0.0
+            self.push(state)
+
+    def heuristic(self, state):
+        """Lower bound on the cost from the boat to state"""
+        return min_moves(self.start[0], self.start[1], state[0], state[1]) * self.lower
+
+    def calculateKey(self, state):
+        best = min(self.g.get(state, math.inf), self.rhs.get(state, math.inf))
+        return (best + self.heuristic(state) + self.km, best)
+
+    def push(self, state):
+        key = self.calculateKey(state) if self.start is not None else (0.0, 0.0)
+        self.queued[state] = key
+        heapq.heappush(self.queue, (key, state))
+
+    def top(self):
+        """(key, state) with the smallest key, dropping stale heap entries"""
+        while self.queue:
+            key, state = self.queue[0]
+            if self.queued.get(state) == key:
+                return key, state
+            heapq.heappop(self.queue)
+        return (math.inf, math.inf), None
+
+    def successors(self, state):
+        """(next state, move cost, heading index) for every legal move out of state"""
+        r, c, k = state
+        costs = self.edge[r, c].tolist()
+        for i in MASK_INDICES[self.legal[r, c]]:
+            dr, dc = HEADING_OFFSETS[i]
+            if self.usesHeading:
+                yield (r + dr, c + dc, i), costs[i] + self.turn[k][i], i
+            else:
+                yield (r + dr, c + dc, 0), costs[i], i
+
+    def predecessors(self, state):
+        """(previous state, move cost) for every legal move into state"""
+        r, c, i = state
+        arriving = [i] if self.usesHeading else range(len(HEADINGS))
+        for j in arriving:
+            if j == NO_HEADING:
+                continue
+            dr, dc = HEADING_OFFSETS[j]
+            pr, pc = r - dr, c - dc
+            if not (0 <= pr < self.rows and 0 <= pc < self.cols) or not self.legal[pr, pc] >> j & 1:
+                continue
+            cost = float(self.edge[pr, pc, j])
+            if not self.usesHeading:
+                yield (pr, pc, 0), cost
+                continue
+            for p in range(NO_HEADING):
+                yield (pr, pc, p), cost + self.turn[p][j]
+            # A boat with no heading yet can only be at the start
+            if (pr, pc, NO_HEADING) == self.start:
+                yield self.start, cost + self.turn[NO_HEADING][j]
+
+    def updateVertex(self, state):
+        if (state[0], state[1]) != self.goal:
+            self.rhs[state] = min((cost + self.g.get(nxt, math.inf)
+                                   for nxt, cost, _ in self.successors(state)), default=math.inf)
+        if self.g.get(state, math.inf) != self.rhs.get(state, math.inf):
+            self.push(state)
+        else:
+            self.queued.pop(state, None)
+
+    def computeShortestPath(self):
+        expanded = 0
+        g, rhs = self.g, self.rhs
+        while True:
+            key, state = self.top()
+            start_rhs = rhs.get(self.start, math.inf)
+            if key >= self.calculateKey(self.start) and start_rhs == g.get(self.start, math.inf):
+                break
+            if state is None:
+                break
+            expanded += 1
+            new_key = self.calculateKey(state)
+            if key < new_key:
+                self.push(state)
+            elif g.get(state, math.inf) > rhs.get(state, math.inf):
+                g[state] = rhs[state]
+                del self.queued[state]
+                for prev, cost in self.predecessors(state):
+                    if cost + g[state] < rhs.get(prev, math.inf):
+                        rhs[prev] = cost + g[state]
+                        self.push(prev)
+            else:
+                g[state] = math.inf
+                self.updateVertex(state)
+                for prev, _ in self.predecessors(state):
+                    self.updateVertex(prev)
+        return expanded
+
+    def plan(self, startPos=None, heading=None):
+        """
+        Route from startPos (default: the map start), arriving there with
+        heading (None for a boat that has not moved yet), to the finish.
+        Returns the route in route.txt format, or None; counters and the
+        replan time are left in self.stats.
+        """
+        t0 = time.perf_counter()
+        y, x = startPos or self.pathfinder.startPos
+        slot = 0
+        if self.usesHeading:
+            slot = NO_HEADING if heading is None else HEADINGS.index(heading)
+        start = (self.rows - y, x - 1, slot)
+
+        # Keys are relative to the boat; km keeps the old ones valid as it moves
+        if self.last is not None:
+            self.km += min_moves(self.last[0], self.last[1], start[0], start[1]) * self.lower
+        self.start = self.last = start
+        if slot == NO_HEADING:
+            self.updateVertex(start)
+
+        expanded = self.computeShortestPath()
+        path, cost = self.extractPath()
+        self.stats = {
+            "found": path is not None,
+            "nodesExpanded": expanded,
+            "routeLength": None if path is None else len(path),
+            "routeCost": cost,
+            "time": time.perf_counter() - t0,
+        }
+        return None if path is None else headingsToRoute(path)
+
+    def extractPath(self):
+        """Follow the cheapest successors from the boat to the finish"""
+        state = self.start
+        cost = self.rhs.get(state, math.inf)
+        if math.isinf(cost):
+            return None, None
+        path = []
+        limit = self.rows * self.cols * (NO_HEADING + 1)
+        while (state[0], state[1]) != self.goal:
+            _, state, i = min((cost + self.g.get(nxt, math.inf), nxt, i)
+                              for nxt, cost, i in self.successors(state))
+            path.append(HEADINGS[i])
+            if len(path) > limit:
+                raise RuntimeError("Route extraction did not reach the finish")
+        return path, cost
+
+    def update_wind(self, cells, new_dir, new_speed):
+        """
+        Patch the wind at logical positions cells (a list of (y, x)) to
+        new_dir / new_speed (one value for all, or one per cell), then
+        repair the search: only moves out of those cells change.
+        """
+        cells = [(self.rows - y, x - 1) for y, x in cells]
+        new_dir = np.broadcast_to(np.asarray(new_dir, dtype=np.float64), (len(cells),))
+        new_speed = np.broadcast_to(np.asarray(new_speed, dtype=np.float64), (len(cells),))
+        pathfinder = self.pathfinder
+        for (r, c), wind_dir, wind_speed in zip(cells, new_dir, new_speed):
+            self.mapData["windDir"][r, c] = wind_dir
+            self.mapData["windSpeed"][r, c] = wind_speed
+
+        for band in sorted({r // TABLE_BAND_ROWS for r, _ in cells}):
+            pathfinder.buildMoveTables(band)
+
+        # A faster wind than any before weakens the heuristic, and every key
+        # already queued with it, so the search starts over
+        max_speed = float(new_speed.max(initial=0))
+        if pathfinder.costModel.minMoveCost(max_speed) < self.lower:
+            pathfinder.minMoveCost = pathfinder.costModel.minMoveCost(max_speed)
+            self.reset(self.finishPos)
+            return
+
+        # Moves out of a cell only depend on its own wind
+        slots = range(NO_HEADING) if self.usesHeading else [0]
+        for r, c in cells:
+            for k in slots:
+                self.updateVertex((r, c, k))
+            if self.start is not None and (r, c) == self.start[:2]:
+                self.updateVertex(self.start)
@@ -0,0 +1,200 @@
+"""
+Robustness of routes under wind uncertainty.
+
+The wind grids are one forecast; the real wind differs from it by errors
+that are similar in nearby cells. perturbWind draws K such winds as
+(K, rows, cols) stacks: spatially correlated Gaussian noise (correlation
+length in cells) added to the direction, and applied as a mean-preserving
+log-normal factor to the speed. scoreRoutes then sails every route
+through all K winds at once and reports how often it runs into the no-go
+zone and how its time is distributed when it does not:
+
+    windDir, windSpeed = perturbWind(mapData, meta, samples=10000, dirSigma=5)
+    scores = scoreRoutes([routeA, routeB], windDir, windSpeed, meta, "time")
+    best = mostRobust(scores)
+
+Run this module to compare the routes a few Pathfinder settings produce:
+
+    python robust.py map_2_Main --samples 10000 --dir-sigma 5
+"""
+import argparse
+import time
+
+import numpy as np
+
+from ai import ALLOWED_MOVES, HEADINGS, CostModel, Pathfinder, readMap, routesToArray
+
+# Noise is made this many samples at a time, to bound the FFT buffers
+NOISE_CHUNK = 1000
+TIME_PERCENTILES = (5, 50, 95)
+
+def correlatedNoise(rng, samples, rows, cols, length):
+    """
+    (samples, rows, cols) float32 noise with unit variance, correlated by
+    exp(-d**2 / (4 * length**2)) between cells d apart: white noise through
+    a Gaussian filter of width length, applied in the frequency domain on a
+    grid padded so opposite edges stay independent
+    """
+    pad = int(np.ceil(3 * length))
+    prows, pcols = rows + pad, cols + pad
+    fy = np.fft.fftfreq(prows)[:, None]
+    fx = np.fft.fftfreq(pcols)[None, :]
+    transfer = np.exp(-2 * (np.pi * length) ** 2 * (fy ** 2 + fx ** 2))
+    # White noise through the filter has the variance of its mean power
+    transfer /= np.sqrt(np.mean(transfer ** 2))
+    transfer = transfer[:, :pcols // 2 + 1]
+
+    noise = np.empty((samples, rows, cols), dtype=np.float32)
+    for k in range(0, samples, NOISE_CHUNK):
+        white = rng.standard_normal((min(NOISE_CHUNK, samples - k), prows, pcols))
+        smooth = np.fft.irfft2(np.fft.rfft2(white) * transfer, s=(prows, pcols))
+        noise[k:k + len(white)] = smooth[:, :rows, :cols]
+    return noise
+
+def perturbWind(mapData, meta, samples=1000, dirSigma=5.0, speedSigma=0.1, length=5.0, seed=0):
+    """
+    samples perturbed copies of a static map's wind: dirSigma degrees of
+    direction error and a speedSigma log-normal speed factor, both
+    correlated over length cells. Returns float32 (samples, rows, cols)
+    windDir and windSpeed stacks.
+    """
+    if mapData.get("times") is not None:
+        raise ValueError("Wind perturbation needs a static wind map")
+    rng = np.random.default_rng(seed)
+    rows, cols = meta["rows"], meta["cols"]
+    wind_dir = np.asarray(mapData["windDir"], dtype=np.float32)
+    wind_speed = np.asarray(mapData["windSpeed"], dtype=np.float32)
+
+    noise = correlatedNoise(rng, samples, rows, cols, length)
+    noise *= dirSigma
+    noise += wind_dir
+    windDir = np.mod(noise, 360, out=noise)
+
+    noise = correlatedNoise(rng, samples, rows, cols, length)
+    noise *= speedSigma
+    noise -= speedSigma ** 2 / 2
+    windSpeed = np.exp(noise, out=noise)
+    windSpeed *= wind_speed
+    return windDir, windSpeed
+
+def routeCells(moves, meta):
+    """
+    Array rows, cols and heading indices of the cells a route's moves
+    leave from, or None if it is malformed, leaves the map or misses the
+    finish (wherever the wind is)
+    """
+    rows, cols = meta["rows"], meta["cols"]
+    y, x = meta["startPos"]
+    cells = []
+    for i in moves:
+        if i < 0:
+            if i == -1:  # ROUTE_END padding
+                break
+            return None
+        cells.append((rows - y, x - 1, i))
+        vector, _ = ALLOWED_MOVES[HEADINGS[i]]
+        y, x = y + vector[0], x + vector[1]
+        if not (1 <= y <= rows and 1 <= x <= cols):
+            return None
+    if [y, x] != list(meta["finishPos"]):
+        return None
+    return np.array(cells, dtype=np.intp).reshape(-1, 3)
+
+def scoreRoutes(routes, windDir, windSpeed, meta, costModel=None):
+    """
+    Sail each route (route.txt text or a list of compass names) through all
+    K winds of (K, rows, cols) stacks. Returns one dict per route:
+      failureRate   share of winds in which some move is in the no-go zone
+                    (1 for a route that does not reach the finish at all)
+      meanTime, stdTime, p5/p50/p95Time
+                    cost under costModel over the winds it survives
+      failedAt      per move, the share of winds in which it is the first
+                    bad move
+    """
+    if costModel is None or isinstance(costModel, str):
+        costModel = CostModel(costModel or "hops")
+    turn = np.array(costModel.turnTable(), dtype=np.float64)
+    headings = np.array(HEADINGS, dtype=np.float64)
+    samples = windDir.shape[0]
+
+    scores = []
+    for moves in routesToArray(routes):
+        cells = routeCells(moves, meta)
+        score = {"moves": None if cells is None else len(cells), "failureRate": 1.0}
+        if cells is None:
+            scores.append(score)
+            continue
+        if not len(cells):
+            # Start is the finish: no move to fail, and no time taken
+            score.update({"failureRate": 0.0, "failedAt": [], "meanTime": 0.0, "stdTime": 0.0,
+                          **{f"p{q}Time": 0.0 for q in TIME_PERCENTILES}})
+            scores.append(score)
+            continue
+        r, c, h = cells.T
+
+        # (K, moves) wind at every cell left, across all samples at once
+        wind_from = (windDir[:, r, c].astype(np.float64) + 180) % 360
+        diff = np.abs(headings[h] - wind_from)
+        rel_angle = np.minimum(diff, 360 - diff)
+        cost = costModel.moveCostGrid(rel_angle, windSpeed[:, r, c].astype(np.float64))
+        bad = (rel_angle < costModel.noGoAngle) | ~np.isfinite(cost)
+        failed = bad.any(axis=1)
+        first_bad = np.where(failed, bad.argmax(axis=1), -1)
+
+        turns = turn[np.concatenate(([len(HEADINGS)], h[:-1])).astype(np.intp), h].sum()
+        times = cost[~failed].sum(axis=1) + turns
+        score["failureRate"] = float(failed.mean())
+        score["failedAt"] = (np.bincount(first_bad[failed], minlength=len(cells)) / samples).tolist()
+        if len(times):
+            score["meanTime"] = float(times.mean())
+            score["stdTime"] = float(times.std())
+            for q, value in zip(TIME_PERCENTILES, np.percentile(times, TIME_PERCENTILES)):
+                score[f"p{q}Time"] = float(value)
+        scores.append(score)
+    return scores
+
+def mostRobust(scores):
+    """Index of the route least likely to fail, the fastest on average among ties"""
+    return min(range(len(scores)),
+               key=lambda i: (scores[i]["failureRate"], scores[i].get("meanTime", np.inf)))
+
+def main():
+    parser = argparse.ArgumentParser(description="Score routes against perturbed winds")
+    parser.add_argument("map", help="map name, e.g. map_2_Main")
+    parser.add_argument("--samples", type=int, default=10000, help="perturbed winds (K)")
+    parser.add_argument("--dir-sigma", type=float, default=5.0, help="direction error, degrees")
+    parser.add_argument("--speed-sigma", type=float, default=0.1, help="log-normal speed error")
+    parser.add_argument("--length", type=float, default=5.0, help="error correlation length, cells")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    mapData, meta = readMap(args.map)
+    # Candidates: the hop and time routes, and time routes planned with a
+    # wider no-go zone as a safety margin; all are scored by the real rules
+    candidates = {"hops": CostModel("hops"), "time": CostModel("time")}
+    for margin in (5, 10, 15):
+        candidates[f"time, no-go +{margin}"] = CostModel("time", noGoAngle=30 + margin)
+    names, routes = [], []
+    for name, costModel in candidates.items():
+        route = Pathfinder(mapData, meta, costModel, engine="bidirectional").search()
+        if route is not None:
+            names.append(name)
+            routes.append(route)
+
+    t0 = time.perf_counter()
+    windDir, windSpeed = perturbWind(mapData, meta, args.samples, args.dir_sigma,
+                                     args.speed_sigma, args.length, args.seed)
+    t1 = time.perf_counter()
+    scores = scoreRoutes(routes, windDir, windSpeed, meta, "time")
+    t2 = time.perf_counter()
+
+    print(f"{args.samples} winds in {t1 - t0:.2f}s, {len(routes)} routes scored in {t2 - t1:.2f}s")
+    print(f"{'route':<18} {'moves':>5} {'fail':>7} {'mean':>8} {'p5':>8} {'p50':>8} {'p95':>8}")
+    for name, score in zip(names, scores):
+        times = " ".join(f"{score.get(key, float('nan')):>8.2f}"
+                         for key in ("meanTime", "p5Time", "p50Time", "p95Time"))
+        print(f"{name:<18} {score['moves']:>5} {score['failureRate']:>7.2%} {times}")
+    print(f"Most robust: {names[mostRobust(scores)]}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,111 @@
+"""
+Cache of solved routes, so identical (map, start, finish, cost model)
+searches are only run once across runs.
+
+Entries are small JSON files named by a hash of the wind grids, meta,
+cost parameters, search settings and endpoints. The directory is capped
+at maxEntries files, evicting the least recently used (a file's mtime is
+bumped on every hit). An in-process LRU of memoryEntries sits in front
+of it for hot repeats within a session. Pass a RouteCache to Pathfinder:
+
+    cache = RouteCache(".route_cache")
+    pathfinder = Pathfinder(mapData, meta, "time", routeCache=cache)
+"""
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from readMap import mapHash
+
+class RouteCache:
+    def __init__(self, directory, maxEntries=1000, memoryEntries=128):
+        self.directory = directory
+        self.maxEntries = maxEntries
+        self.memoryEntries = memoryEntries
+        self.memory = OrderedDict()
+        self.hits = {"memory": 0, "disk": 0}
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+        self.diskEntries = len(self.files())
+
+    @staticmethod
+    def mapKey(mapData, meta, *settings):
+        """Hash of everything about a search except its endpoints"""
+        return mapHash(mapData, meta, mapData.get("times"), *settings)
+
+    @staticmethod
+    def routeKey(mapKey, startPos, finishPos):
+        text = json.dumps([mapKey, list(startPos), list(finishPos)])
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()[:24]
+
+    def files(self):
+        return [name for name in os.listdir(self.directory) if name.endswith(".json")]
+
+    def path(self, key):
+        return os.path.join(self.directory, key + ".json")
+
+    def remember(self, key, entry):
+        self.memory[key] = entry
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memoryEntries:
+            self.memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        The cached entry ({"path", "cost", "counters"}) for a route key, or
+        None on a miss
+        """
+        if key in self.memory:
+            self.memory.move_to_end(key)
+            self.hits["memory"] += 1
+            return self.memory[key]
+        path = self.path(key)
+        try:
+            with open(path) as f:
+                entry = json.load(f)
+            os.utime(path)
+        except (OSError, ValueError):
+            self.misses += 1
+            return None
+        self.hits["disk"] += 1
+        self.remember(key, entry)
+        return entry
+
+    def put(self, key, path, cost, counters):
+        entry = {"path": path, "cost": cost, "counters": counters}
+        self.remember(key, entry)
+
+        # Write then rename, so readers never see half a file
+        target = self.path(key)
+        existed = os.path.exists(target)
+        temp = f"{target}.{os.getpid()}.tmp"
+        with open(temp, "w") as f:
+            json.dump(entry, f)
+        os.replace(temp, target)
+        if not existed:
+            self.diskEntries += 1
+            if self.diskEntries > self.maxEntries:
+                self.evict()
+
+    def evict(self):
+        """Drop the least recently used files down to maxEntries"""
+        entries = []
+        for name in self.files():
+            try:
+                entries.append((os.path.getmtime(os.path.join(self.directory, name)), name))
+            except OSError:
+                continue
+        entries.sort()
+        for _, name in entries[:max(len(entries) - self.maxEntries, 0)]:
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except OSError:
+                pass
+        self.diskEntries = min(len(entries), self.maxEntries)
+
+    def clear(self):
+        self.memory.clear()
+        for name in self.files():
+            os.remove(os.path.join(self.directory, name))
+        self.diskEntries = 0
@@ -0,0 +1,222 @@
+"""
+Long-running planning service.
+
+Maps, Pathfinders and their move tables stay resident in a pool of worker
+processes, so a request only pays for the search. Clients connect over a
+Unix or TCP socket and send one JSON object per line:
+
+    {"id": 7, "map": "map_2_Main", "start": [30, 1], "finish": [1, 20],
+     "cost": "time", "engine": "astar"}
+
+Only "map" is required; start/finish default to the map's own, cost to
+"hops" and engine to "astar". Each request gets one JSON line back as
+soon as it is solved (so replies on a connection can come back out of
+order; match them on "id"), with the route in the route.txt format:
+
+    {"id": 7, "found": true, "route": "NE\\nNE\\n...", "length": 33,
+     "cost": 88.42, "searchTime": 0.012}
+
+or {"id": 7, "error": "..."}. A line that is not a JSON object, or is
+longer than the stream limit (64 KiB), gets {"id": null, "error": "..."}.
+
+    python server.py --unix /tmp/planner.sock --preload map_2_Main
+    python server.py --port 8765 --workers 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+from ai import SEARCH_ENGINES, Pathfinder, readMap
+from routeCache import RouteCache
+
+# Map names are plain file stems inside the map directory
+MAP_NAME = re.compile(r"^[\w.-]+$")
+COST_MODELS = ("hops", "time")
+
+# Per-process state set up by initWorker
+_worker = {}
+
+def initWorker(mapDir, preload, cacheDir):
+    _worker["mapDir"] = mapDir
+    _worker["maps"] = {}
+    _worker["pathfinders"] = {}
+    _worker["cache"] = RouteCache(cacheDir) if cacheDir else None
+    for name in preload:
+        loadMap(name)
+
+def loadMap(name):
+    if name not in _worker["maps"]:
+        if not MAP_NAME.match(name):
+            raise ValueError(f"Bad map name: {name!r}")
+        _worker["maps"][name] = readMap(os.path.join(_worker["mapDir"], name))
+    return _worker["maps"][name]
+
+def getPathfinder(name, cost, engine):
+    """One warm Pathfinder per (map, cost model, engine) in each worker"""
+    key = (name, cost, engine)
+    if key not in _worker["pathfinders"]:
+        mapData, meta = loadMap(name)
+        _worker["pathfinders"][key] = Pathfinder(mapData, meta, cost, engine=engine,
+                                                 routeCache=_worker["cache"])
+    return _worker["pathfinders"][key]
+
+def position(value, meta, field):
+    if (not isinstance(value, list) or len(value) != 2
+            or not all(isinstance(v, int) and not isinstance(v, bool) for v in value)):
+        raise ValueError(f"{field} must be [y, x]")
+    y, x = value
+    if not (1 <= y <= meta["rows"] and 1 <= x <= meta["cols"]):
+        raise ValueError(f"{field} {value} is off the {meta['rows']}x{meta['cols']} map")
+    return value
+
+def solveRequest(request):
+    """Run one request in a worker process; returns the reply object"""
+    reply = {"id": request.get("id")}
+    try:
+        name = request.get("map")
+        if not isinstance(name, str):
+            raise ValueError("map is required")
+        cost = request.get("cost", "hops")
+        engine = request.get("engine", "astar")
+        if cost not in COST_MODELS:
+            raise ValueError(f"Unknown cost model: {cost!r}")
+        if engine not in SEARCH_ENGINES:
+            raise ValueError(f"Unknown search engine: {engine!r}")
+
+        _, meta = loadMap(name)
+        start = position(request.get("start", meta["startPos"]), meta, "start")
+        finish = position(request.get("finish", meta["finishPos"]), meta, "finish")
+        pathfinder = getPathfinder(name, cost, engine)
+        route = pathfinder.search(start, finish)
+        stats = pathfinder.stats
+        reply.update({
+            "found": route is not None,
+            "route": route,
+            "length": stats["routeLength"],
+            "cost": stats["routeCost"],
+            "searchTime": stats["time"]["search"],
+        })
+    except (OSError, ValueError) as e:
+        reply["error"] = str(e)
+    except Exception as e:
+        # Anything else a malformed request trips still gets its one reply,
+        # rather than taking the connection's other requests down with it
+        reply["error"] = f"{type(e).__name__}: {e}"
+    return reply
+
+async def readLine(reader):
+    """
+    The next line from reader: b"" at the end of input, or None for a line
+    longer than the reader's limit, which is skipped up to its newline
+    """
+    try:
+        return await reader.readuntil(b"\n")
+    except asyncio.IncompleteReadError as e:
+        return e.partial  # a last line without a newline, or b""
+    except asyncio.LimitOverrunError as e:
+        overrun = e
+    try:
+        while True:
+            # Drop what is buffered of the line and look again for its end
+            await reader.readexactly(overrun.consumed)
+            try:
+                await reader.readuntil(b"\n")
+                return None
+            except asyncio.LimitOverrunError as e:
+                overrun = e
+    except asyncio.IncompleteReadError:
+        return None
+
+class PlanningServer:
+    def __init__(self, workers=None, mapDir=".", preload=(), cacheDir=None):
+        self.pool = ProcessPoolExecutor(workers, initializer=initWorker,
+                                        initargs=(mapDir, list(preload), cacheDir))
+        self.served = 0
+
+    async def handle(self, reader, writer):
+        """Serve one connection: every line is solved concurrently"""
+        lock = asyncio.Lock()
+        pending = set()
+        try:
+            while True:
+                line = await readLine(reader)
+                if line is None:
+                    await self.send({"id": None, "error": "Request line is too long"}, writer, lock)
+                    continue
+                if not line:
+                    break
+                if not line.strip():
+                    continue
+                task = asyncio.create_task(self.respond(line, writer, lock))
+                pending.add(task)
+                task.add_done_callback(pending.discard)
+            if pending:
+                await asyncio.gather(*pending)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, line, writer, lock):
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise ValueError
+        except ValueError:
+            reply = {"id": None, "error": "Each line must be a JSON object"}
+        else:
+            loop = asyncio.get_running_loop()
+            try:
+                reply = await loop.run_in_executor(self.pool, solveRequest, request)
+            except Exception as e:
+                # The worker died (BrokenProcessPool) or the request could
+                # not be handed to it; the request still gets its reply
+                reply = {"id": request.get("id"), "error": f"{type(e).__name__}: {e}"}
+        await self.send(reply, writer, lock)
+
+    async def send(self, reply, writer, lock):
+        self.served += 1
+        async with lock:
+            writer.write(json.dumps(reply).encode("utf-8") + b"\n")
+            await writer.drain()
+
+    async def serve(self, unix=None, host="127.0.0.1", port=8765):
+        if unix:
+            if os.path.exists(unix):
+                os.remove(unix)
+            server = await asyncio.start_unix_server(self.handle, unix)
+            where = unix
+        else:
+            server = await asyncio.start_server(self.handle, host, port)
+            where = f"{host}:{port}"
+        print(f"Planning server listening on {where}", flush=True)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            self.pool.shutdown(cancel_futures=True)
+            if unix and os.path.exists(unix):
+                os.remove(unix)
+
+def main():
+    parser = argparse.ArgumentParser(description="Route planning server (JSON lines over a socket)")
+    parser.add_argument("--unix", help="Unix socket path (default: TCP)")
+    parser.add_argument("--host", default="127.0.0.1", help="TCP host (default: %(default)s)")
+    parser.add_argument("--port", type=int, default=8765, help="TCP port (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--map-dir", default=".", help="directory the maps are read from")
+    parser.add_argument("--preload", nargs="*", default=[], help="maps to load in every worker at start")
+    parser.add_argument("--cache", default=None, help="route cache directory (default: no cache)")
+    args = parser.parse_args()
+
+    server = PlanningServer(args.workers, args.map_dir, args.preload, args.cache)
+    try:
+        asyncio.run(server.serve(args.unix, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
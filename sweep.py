@@ -0,0 +1,178 @@
+"""
+Sweep time cost-model parameters over several maps.
+
+Every combination of the parameter grid is solved on every map, on a pool
+of worker processes sharing the wind grids (see batch.py). Work that does
+not depend on a parameter is done once: the heading / wind angles of each
+map once per worker, and the move tables once per (map, noGoAngle,
+polarBands, baseTime), so runs that only differ in turnPenalties reuse
+them. The results table has route time, length and solve time per run:
+
+    python sweep.py --grid grid.json --maps map_1_Training map_2_Main --out sweep.csv
+
+A grid file gives a list of values per parameter, anything missing keeps
+its CostModel default:
+
+    {"noGoAngle": [30, 40], "baseTime": [10],
+     "polarBands": [[[30, 1.0], [60, 0.95], [90, 0.85], [135, 0.7]]],
+     "turnPenalties": [{"0": 0, "60": 4, "120": 4, "180": 4},
+                       {"0": 0, "60": 2, "120": 4, "180": 6}]}
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from ai import POLAR_BANDS, TURN_PENALTIES, CostModel, Pathfinder, readMap, windAngles
+from batch import attachWind, mapExtras, shareWind
+
+SHIPPED_MAPS = ["map_1_Training", "map_2_Main", "map_3_Tiebreaker"]
+
+# Parameters that shape the move tables; the rest only change the search
+TABLE_PARAMS = ("noGoAngle", "polarBands", "baseTime")
+DEFAULT_GRID = {
+    "noGoAngle": [30, 45],
+    "polarBands": [POLAR_BANDS],
+    "baseTime": [10],
+    "turnPenalties": [TURN_PENALTIES, {0: 0, 60: 2, 120: 4, 180: 6}],
+}
+RESULT_FIELDS = ["map", "noGoAngle", "baseTime", "polarBands", "turnPenalties", "found",
+                 "routeLength", "routeTime", "searchTime", "tablesTime", "tablesReused"]
+
+# Per-process state set up by initWorker
+_worker = {}
+
+def readGrid(path):
+    """Load a grid file, turning JSON's string turn-penalty keys back into degrees"""
+    with open(path) as f:
+        grid = json.load(f)
+    if "polarBands" in grid:
+        grid["polarBands"] = [[tuple(band) for band in bands] for bands in grid["polarBands"]]
+    if "turnPenalties" in grid:
+        grid["turnPenalties"] = [{int(change): penalty for change, penalty in table.items()}
+                                 for table in grid["turnPenalties"]]
+    return grid
+
+def expandGrid(grid):
+    """
+    Group the grid's combinations by their move-table parameters: a list of
+    (table parameters, [turnPenalties, ...]) pairs
+    """
+    unknown = set(grid) - set(TABLE_PARAMS) - {"turnPenalties"}
+    if unknown:
+        raise ValueError(f"Unknown sweep parameters: {', '.join(sorted(unknown))}")
+    defaults = CostModel("time")
+    values = [grid.get(name) or [getattr(defaults, name)] for name in TABLE_PARAMS]
+    turns = grid.get("turnPenalties") or [defaults.turnPenalties]
+    return [(dict(zip(TABLE_PARAMS, combo)), turns) for combo in itertools.product(*values)]
+
+def initWorker(shared):
+    _worker["maps"] = {}
+    _worker["blocks"] = []
+    _worker["angles"] = {}
+    for name, (specs, extras, meta) in shared.items():
+        mapData, blocks = attachWind(specs)
+        mapData.update(extras)
+        _worker["maps"][name] = (mapData, meta)
+        _worker["blocks"] += blocks
+
+def mapAngles(name):
+    """windAngles for a whole static map, worked out once per worker"""
+    if name not in _worker["angles"]:
+        mapData, meta = _worker["maps"][name]
+        _worker["angles"][name] = windAngles(mapData["windDir"], 0, meta["rows"], meta["cols"])
+    return _worker["angles"][name]
+
+def runGroup(task):
+    """Solve one map for one set of table parameters and each turn table"""
+    name, tableParams, turns = task
+    mapData, meta = _worker["maps"][name]
+    static = mapData.get("times") is None
+
+    t0 = time.perf_counter()
+    tables = None
+    if static:
+        wind_speed = np.asarray(mapData["windSpeed"], dtype=np.float64)
+        tables = CostModel("time", **tableParams).moveTables(*mapAngles(name), wind_speed)
+    tables_time = time.perf_counter() - t0
+
+    results = []
+    for n, turnPenalties in enumerate(turns):
+        costModel = CostModel("time", turnPenalties=turnPenalties, **tableParams)
+        pathfinder = Pathfinder(mapData, meta, costModel, maxExpansions=None)
+        if tables is not None:
+            pathfinder.setMoveTables(*tables)
+        pathfinder.search()
+        stats = pathfinder.stats
+        results.append({
+            "map": name,
+            **tableParams,
+            "turnPenalties": turnPenalties,
+            "found": stats["found"],
+            "routeLength": stats["routeLength"],
+            "routeTime": stats["routeCost"],
+            "searchTime": stats["time"]["search"],
+            "tablesTime": tables_time,
+            "tablesReused": static and n > 0,
+        })
+    return results
+
+def runSweep(mapNames, grid=None, workers=None):
+    """Every grid combination on every map; a list of result rows"""
+    groups = expandGrid(grid or DEFAULT_GRID)
+    maps = {name: readMap(name) for name in mapNames}
+    blocks, shared = [], {}
+    for name, (mapData, meta) in maps.items():
+        map_blocks, specs = shareWind(mapData)
+        blocks += map_blocks
+        extras = mapExtras(mapData)
+        shared[name] = (specs, extras, meta)
+
+    tasks = [(name, tableParams, turns) for name in mapNames for tableParams, turns in groups]
+    try:
+        with ProcessPoolExecutor(workers or os.cpu_count(), initializer=initWorker,
+                                 initargs=(shared,)) as pool:
+            return [row for rows in pool.map(runGroup, tasks) for row in rows]
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+
+def writeResults(path, results):
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=RESULT_FIELDS)
+        writer.writeheader()
+        for row in results:
+            row = dict(row)
+            for key in ("polarBands", "turnPenalties"):
+                row[key] = json.dumps(row[key])
+            writer.writerow(row)
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep cost-model parameters across maps")
+    parser.add_argument("--grid", default=None, help="JSON parameter grid (default: a small built-in one)")
+    parser.add_argument("--maps", nargs="+", default=SHIPPED_MAPS, help="maps to solve")
+    parser.add_argument("--workers", type=int, default=None, help="worker processes (default: all cores)")
+    parser.add_argument("--out", default="sweep_results.csv", help="CSV results table")
+    args = parser.parse_args()
+
+    grid = readGrid(args.grid) if args.grid else None
+    t0 = time.perf_counter()
+    results = runSweep(args.maps, grid, args.workers)
+    writeResults(args.out, results)
+
+    print(f"{'map':<18} {'noGo':>5} {'base':>5} {'turns':<22} {'moves':>6} {'time':>9} {'search':>8}")
+    for row in results:
+        turns = "/".join(str(row["turnPenalties"][change]) for change in sorted(row["turnPenalties"]))
+        time_text = f"{row['routeTime']:.2f}" if row["found"] else "-"
+        print(f"{row['map']:<18} {row['noGoAngle']:>5} {row['baseTime']:>5} {turns:<22} "
+              f"{row['routeLength'] or '-':>6} {time_text:>9} {row['searchTime']:>7.3f}s")
+    print(f"{len(results)} runs in {time.perf_counter() - t0:.2f}s -> {args.out}")
+
+if __name__ == "__main__":
+    main()
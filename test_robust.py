@@ -0,0 +1,39 @@
+"""robust.scoreRoutes on routes sailed through perturbed winds"""
+import os
+
+import pytest
+
+from ai import Pathfinder, readMap
+from robust import perturbWind, scoreRoutes
+
+@pytest.fixture(scope="module")
+def winds():
+    mapData, meta = readMap(os.path.join(os.path.dirname(__file__), "map_2_Main"))
+    windDir, windSpeed = perturbWind(mapData, meta, samples=50, dirSigma=5)
+    return mapData, meta, windDir, windSpeed
+
+def test_empty_route_scores_zero(winds):
+    mapData, meta, windDir, windSpeed = winds
+    meta = {**meta, "finishPos": meta["startPos"]}
+    route = Pathfinder(mapData, meta, "time").search()
+    assert route == ""
+    score, = scoreRoutes([route], windDir, windSpeed, meta, "time")
+    assert score["moves"] == 0
+    assert score["failureRate"] == 0
+    assert score["failedAt"] == []
+    assert score["meanTime"] == score["p95Time"] == 0
+
+def test_route_scored_in_every_wind(winds):
+    mapData, meta, windDir, windSpeed = winds
+    route = Pathfinder(mapData, meta, "time").search()
+    score, = scoreRoutes([route], windDir, windSpeed, meta, "time")
+    assert score["moves"] == len(route.split())
+    assert len(score["failedAt"]) == score["moves"]
+    assert 0 <= score["failureRate"] <= 1
+    assert sum(score["failedAt"]) == pytest.approx(score["failureRate"])
+
+def test_route_missing_finish_fails(winds):
+    _, meta, windDir, windSpeed = winds
+    score, = scoreRoutes(["N"], windDir, windSpeed, meta, "time")
+    assert score["moves"] is None
+    assert score["failureRate"] == 1
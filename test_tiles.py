@@ -0,0 +1,43 @@
+"""Tiled maps: searchTiled matches A* and reads each tile about once"""
+import pytest
+
+import engines
+from ai import Pathfinder
+from bench import makeSyntheticMap
+from readMap import readTiledMap, writeTiledMap
+
+@pytest.fixture(scope="module")
+def synthetic(tmp_path_factory):
+    mapData, meta = makeSyntheticMap(200, 200)
+    path = str(tmp_path_factory.mktemp("tiles") / "synthetic.wtiles")
+    writeTiledMap(path, mapData, meta, tileSize=32)
+    return mapData, meta, path
+
+def tiledSearch(path, maxTiles):
+    mapData, meta = readTiledMap(path, maxTiles=maxTiles)
+    pathfinder = Pathfinder(mapData, meta, "time", maxExpansions=None)
+    return pathfinder, pathfinder.search()
+
+def test_same_route_as_astar(synthetic):
+    mapData, meta, path = synthetic
+    exact = Pathfinder(mapData, meta, "time", maxExpansions=None)
+    _, route = tiledSearch(path, maxTiles=64)
+    assert route == exact.search()
+
+def test_small_cache_does_not_thrash(synthetic):
+    _, _, path = synthetic
+    with pytest.warns(RuntimeWarning, match="frontier spans"):
+        pathfinder, _ = tiledSearch(path, maxTiles=2)
+    stats = pathfinder.stats
+    # 7 x 7 tiles on the map; each tile's tables are built about once and
+    # each build reads the tile of both grids
+    assert stats["tileTablesBuilt"] <= 49
+    assert stats["tileMisses"] <= 2 * stats["tileTablesBuilt"]
+    assert stats["tileTableLimit"] > 2
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_frontier_past_budget_raises(synthetic, monkeypatch):
+    _, _, path = synthetic
+    monkeypatch.setattr(engines, "TILE_TABLE_BYTES", 32 * 32 * 25 * 3)
+    with pytest.raises(ValueError, match="frontier spans"):
+        tiledSearch(path, maxTiles=2)